@@ -1,19 +1,16 @@
 import streamlit as st
 import os
-import base64
-from PIL import Image
-from textile_core import predict_image  # Import the core functionality
-
-
-# Helper function to encode image to base64
-def _get_image_base64(image_path):
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
+from textile_core import decode_upload, predict_upload, warm_up  # Import the core functionality
+from prediction_cache import get_prediction_cache
+from static_assets import asset_data_uri
 
 
 # Set Streamlit page config
 st.set_page_config(page_title="Textile Classification", layout="centered")
 
+# Load and warm up the shared model in the background while the page renders
+warm_up(background=True)
+
 # Custom CSS for styling
 # Custom CSS for styling
 st.markdown(
@@ -126,7 +123,7 @@ logo_path = os.path.join(os.path.dirname(__file__), "logo.png")
 st.markdown(
     f"""
     <div class="header">
-        <img src="data:image/png;base64,{_get_image_base64(logo_path)}" class="header-logo">
+        <img src="{asset_data_uri(logo_path, 150)}" class="header-logo">
         <h1 class="header-title">Textile Classification App</h1>
     </div>
     """,
@@ -146,23 +143,17 @@ st.info("📂 Please upload an image to start classification.", icon="📂")
 uploaded_file = st.file_uploader("", type=["jpg", "png", "jpeg"], label_visibility="collapsed")
 
 if uploaded_file:
-    # Save uploaded file locally
-    temp_dir = "temp_dir"
-    os.makedirs(temp_dir, exist_ok=True)
-    file_path = os.path.join(temp_dir, uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
-    # Display uploaded image
-    img = Image.open(file_path)
+    # Decode the upload once, in memory and at display resolution; the same image is classified
+    upload_data = uploaded_file.getbuffer()
+    img = decode_upload(upload_data)
     st.image(img, caption="📌 Uploaded Image", use_column_width=True)
 
     # Classify the image
     st.write(" **Classifying... Please wait.**")
     with st.spinner("⏳ Processing..."):
         try:
-            # Prediction
-            class_name, confidence = predict_image(file_path)
+            # Prediction (re-uploads of the same image are answered from the cache)
+            class_name, confidence = predict_upload(upload_data, img, cache=get_prediction_cache())
 
             # Color map for different classes
             color_map = {
@@ -186,11 +177,14 @@ if uploaded_file:
                 unsafe_allow_html=True,
             )
 
+            cache_stats = get_prediction_cache().stats()
+            st.caption(f"Prediction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
         except Exception as e:
             st.error(f"❌ Prediction failed: {e}")
 
-# Encode the logo for use in the footer
-logo_base64 = _get_image_base64(logo_path)
+# Footer logo, resized and encoded once per process
+logo_uri = asset_data_uri(logo_path, 70)
 
 # Footer with Contact Us section
 st.markdown(
@@ -210,7 +204,7 @@ st.markdown(
             </a>
             <!-- Clickable Logo Linking to the Website -->
             <a href="https://insightmindmatrix.com/" target="_blank" style="color:white;margin-left:70px;"><strong id="about">about us</strong>
-                <img src="data:image/png;base64,{logo_base64}" style="margin-left: 10px; width:70px; margin-bottom:15px;"> 
+                <img src="{logo_uri}" style="margin-left: 10px; width:70px; margin-bottom:15px;"> 
             </a>
         </div>
         <p><i>© 2025 Textile Classification App. | All Rights Reserved to Insight Mind Matrix </i></p>
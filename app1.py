@@ -1,23 +1,39 @@
 import streamlit as st
 import os
-import base64
 import tempfile
-from PIL import Image
-from textile_core import predict_image
+import time
+from textile_core import DEFAULT_BATCH_SIZE, UPLOAD_MAX_SIDE, decode_upload, predict_frame, predict_upload, warm_up
+from prediction_cache import get_prediction_cache
+from static_assets import asset_data_uri
 import cv2
 from streamlit_option_menu import option_menu
 import shutil
+from video_engine import overlay_label
+from video_stream import get_download_server, process_video_streaming, save_upload
+from change_detection import ChangeDetector, DEFAULT_MAX_STALENESS, DEFAULT_THRESHOLD
+from tiling import check_scan_size, classify_tiles, overlay_heatmap
+from instrumentation import count, stage
+from live_capture import LatencyTracker, LatestFrameCapture
+from multi_stream import MultiStreamScheduler
+from event_recorder import DEFAULT_POST_SECONDS, DEFAULT_PRE_SECONDS, EventRecorder
 
+# Frames per model call when processing uploaded videos, from the host's autotuned profile
+VIDEO_BATCH_SIZE = DEFAULT_BATCH_SIZE
 
-# Helper function to encode image to base64
-def _get_image_base64(image_path):
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
+# Show one preview image for every N processed video frames
+PREVIEW_EVERY = 10
+
+# Largest result file offered through st.download_button when a download server is configured;
+# bigger ones are streamed from disk by the server instead of being held in memory by Streamlit
+INLINE_DOWNLOAD_LIMIT = 4 * 1024 ** 2
 
 
 # Set Streamlit page config
 st.set_page_config(page_title="Textile Classification", layout="centered")
 
+# Load and warm up the shared model in the background while the page renders
+warm_up(background=True)
+
 
 # Custom CSS for styling
 st.markdown(
@@ -131,7 +147,7 @@ logo_path = os.path.join(os.path.dirname(__file__), "insight_wave.jpg")
 st.markdown(
     f"""
     <div class="header">
-        <img src="data:image/png;base64,{_get_image_base64(logo_path)}" class="header-logo">
+        <img src="{asset_data_uri(logo_path, 100)}" class="header-logo">
         <h1 class="header-title">Textile Classification App</h1>
     </div>
     """,
@@ -141,16 +157,31 @@ st.markdown(
 
 # Webcam classification function
 def classify_frame(frame):
-    """Process frame and classify using the model."""
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    cv2.imwrite(temp_file.name, frame)
-    class_name, confidence = predict_image(temp_file.name)
+    """Classify an OpenCV (BGR) frame in memory using the model."""
+    class_name, confidence = predict_frame(frame, color_order="BGR", cache=get_prediction_cache())
     return class_name, confidence
 
 
+def frame_skipping_controls(key):
+    """Render the adaptive frame-skipping settings and return a ChangeDetector, or None when disabled."""
+    with st.expander("⚙️ Adaptive frame skipping"):
+        enabled = st.checkbox("Only classify frames whose content changed", value=True, key=f"{key}_skip")
+        threshold = st.slider(
+            "Change threshold (mean grey-level difference)", 0.0, 30.0, DEFAULT_THRESHOLD, 0.5,
+            key=f"{key}_threshold", disabled=not enabled,
+        )
+        max_staleness = st.slider(
+            "Maximum frames reusing the last label", 1, 120, DEFAULT_MAX_STALENESS,
+            key=f"{key}_staleness", disabled=not enabled,
+        )
+    if not enabled:
+        return None
+    return ChangeDetector(threshold=threshold, max_staleness=max_staleness)
+
+
 
-# Encode the image before inserting it
-website_logo = _get_image_base64("insight_wave.jpg")
+# Sidebar logo, resized and encoded once per process
+website_logo = asset_data_uri("insight_wave.jpg", 130)
 
 # Sidebar using streamlit_option_menu
 with st.sidebar:
@@ -167,7 +198,7 @@ with st.sidebar:
             }}
         </style>
         
-        <img class="custom-image" src="data:image/png;base64,{website_logo}">  
+        <img class="custom-image" src="{website_logo}">  
         """,
         unsafe_allow_html=True
     )
@@ -176,8 +207,8 @@ with st.sidebar:
     # Sidebar menu
     selected_option = option_menu(
         menu_title="NAV",  # Sidebar title
-        options=["Upload Image", "Upload Video", "Real_Time Classification"],  # Menu options
-        icons=["upload", "upload", "camera"],  # Icons for each option
+        options=["Upload Image", "Upload Video", "Real_Time Classification", "Multi-Stream"],  # Menu options
+        icons=["upload", "upload", "camera", "grid"],  # Icons for each option
         menu_icon="cast",  # Sidebar menu icon
         default_index=0,  # Default selected option
         styles={
@@ -223,22 +254,34 @@ if selected_option == "Upload Image":
 
     if uploaded_file:
         # Convert uploaded file to OpenCV format
-        temp_dir = "temp_dir"
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        # Display uploaded image
-        img = Image.open(file_path)
+        # Small defects vanish when a large scan is shrunk to 64x64, so offer patch-wise inspection
+        tiled = st.checkbox("🔍 High-resolution tiled inspection")
+
+        # Decode the upload once, in memory; full resolution is only needed for tiling
+        upload_data = uploaded_file.getbuffer()
+        max_side = None if tiled else UPLOAD_MAX_SIDE
+        if tiled:
+            # Encoded uploads are decoded whole; refuse scans that would not fit in memory
+            try:
+                check_scan_size(upload_data)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                st.stop()
+        img = decode_upload(upload_data, max_side)
         st.image(img,   use_container_width=True)
 
         # Classify the image
         st.write(" **Classifying... Please wait.**")
         with st.spinner("⏳ Processing..."):
             try:
-                # Prediction
-                class_name, confidence = predict_image(file_path)
+                if tiled:
+                    result = classify_tiles(img)
+                    class_name = result['verdict']
+                    st.image(overlay_heatmap(img, result), caption="Defect heatmap", use_container_width=True)
+                    st.caption(f"{int(result['flagged'].sum())} of {result['flagged'].size} tiles flagged")
+                else:
+                    # Prediction (re-uploads of the same image are answered from the cache)
+                    class_name, confidence = predict_upload(upload_data, img, get_prediction_cache(), max_side)
 
                 # Color map for different classes
                 color_map = {
@@ -262,59 +305,63 @@ if selected_option == "Upload Image":
                     unsafe_allow_html=True,
                 )
 
+                cache_stats = get_prediction_cache().stats()
+                st.caption(f"Prediction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
             except Exception as e:
                 st.error(f"❌ Prediction failed: {e}")
 
 
-def process_uploaded_video(video_file):
-    """Handles video processing and classification, then returns a downloadable processed video."""
+def process_uploaded_video(video_file, detector=None):
+    """Handles video processing and classification, then offers the processed video and its label timeline."""
     st.subheader("Processing Video...")
-    
-    # Create a temporary directory to store video files
-    temp_dir = tempfile.mkdtemp()
+
+    # Results of the previous run stay downloadable until the next one starts
+    previous_dir = st.session_state.get("video_results_dir")
+    if previous_dir:
+        server = get_download_server()
+        if server is not None:
+            server.unregister_dir(previous_dir)
+        shutil.rmtree(previous_dir, ignore_errors=True)
+    temp_dir = tempfile.mkdtemp(prefix="video_results_")
+    st.session_state.video_results_dir = temp_dir
     input_path = os.path.join(temp_dir, "input_video.mp4")
-    output_path = os.path.join(temp_dir, "output_video.mp4")
-    
-    # Save the uploaded video
-    with open(input_path, "wb") as f:
-        f.write(video_file.read())
-    
-    # Initialize video processing
-    cap = cv2.VideoCapture(input_path)
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    frame_width, frame_height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    
-    out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+
+    # Copy the upload to disk in chunks instead of materializing another copy of it
+    save_upload(video_file, input_path)
+
+    # Decode, classify in batches and encode in a pipelined engine with bounded frame buffers
     frame_placeholder = st.empty()
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Classify the frame and overlay text
-        label, confidence = classify_frame(frame)
-        cv2.putText(
-            frame, f"{label} ({confidence:.2f}%)", (10, 50),
-            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA
-        )
-        
-        # Display the processed frame
-        frame_placeholder.image(frame, channels="BGR")
-        out.write(frame)
-    
-    # Release resources
-    cap.release()
-    out.release()
-    st.success("✅ Video processing completed!")
-    
-    # Provide download option
-    with open(output_path, "rb") as f:
-        st.download_button("⬇️ Download Processed Video", f.read(), "processed_video.mp4", "video/mp4")
-    
-    # Clean up temporary files
-    shutil.rmtree(temp_dir)
+
+    def show_preview(index, frame, label, confidence):
+        # Rendering every frame in the browser would dominate the run time
+        if index % PREVIEW_EVERY == 0:
+            with stage("render"):
+                frame_placeholder.image(frame, channels="BGR")
+
+    stats = process_video_streaming(
+        input_path, temp_dir, on_frame=show_preview, detector=detector, batch_size=VIDEO_BATCH_SIZE
+    )
+    os.remove(input_path)
+    st.success(
+        f"✅ Video processing completed! {stats['frames']} frames in {stats['seconds']:.1f}s "
+        f"({stats['fps']:.1f} FPS, {stats['skip_ratio']:.0%} of frames skipped)"
+    )
+
+    # Large files are streamed from disk by the download server when one is reachable; otherwise
+    # (and for small files) the download button serves the file straight from its open handle
+    downloads = [
+        ("⬇️ Download Processed Video", stats["video_path"], "video/mp4"),
+        ("⬇️ Per-frame labels (CSV)", stats["csv_path"], "text/csv"),
+        ("⬇️ Label segments (JSON)", stats["json_path"], "application/json"),
+    ]
+    server = get_download_server()
+    for caption, path, mime in downloads:
+        if server is not None and os.path.getsize(path) > INLINE_DOWNLOAD_LIMIT:
+            st.markdown(f"[{caption}]({server.register(path)})")
+        else:
+            with open(path, "rb") as f:
+                st.download_button(caption, f, os.path.basename(path), mime, key=path)
 
 # Video Upload Section
 if selected_option == "Upload Video":
@@ -323,8 +370,9 @@ if selected_option == "Upload Video":
     
     if uploaded_video:
         st.video(uploaded_video)
+        detector = frame_skipping_controls("video")
         if st.button("▶ Start Video Processing"):
-            process_uploaded_video(uploaded_video)
+            process_uploaded_video(uploaded_video, detector)
 
 # Option 3: Real_Time Classification
 elif selected_option == "Real_Time Classification":
@@ -337,6 +385,19 @@ elif selected_option == "Real_Time Classification":
         temp_video = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
         st.session_state.video_file_path = temp_video.name
         temp_video.close()
+    if 'clips_dir' not in st.session_state:
+        st.session_state.clips_dir = tempfile.mkdtemp(prefix="defect_clips_")
+
+    detector = frame_skipping_controls("live")
+
+    # Recording: short clips around defects by default, the full stream only on request
+    with st.expander("🎞️ Recording"):
+        record_events = st.checkbox("Save clips around detected defects", value=True)
+        pre_seconds = st.slider("Seconds before a defect", 0.0, 30.0, DEFAULT_PRE_SECONDS, 0.5,
+                                disabled=not record_events)
+        post_seconds = st.slider("Seconds after a defect", 0.0, 30.0, DEFAULT_POST_SECONDS, 0.5,
+                                 disabled=not record_events)
+        record_full_stream = st.checkbox("Also record the full stream", value=False)
 
     # Buttons for controlling classification
     start_button = st.button("▶ Start Classification")
@@ -348,52 +409,161 @@ elif selected_option == "Real_Time Classification":
     if stop_button:
         st.session_state.live_classifying = False
 
-    # Start video capture
+    # Start video capture on its own thread; the loop below always works on the newest frame
     if st.session_state.live_classifying:
-        cap =cv2.VideoCapture(0)
-        if not cap.isOpened():
+        capture = LatestFrameCapture(0)
+        if not capture.start():
             st.error("❌ Could not access the webcam.")
 
         else:
             stframe = st.empty()
-            
-            # Set up video writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Video codec
-            fps = 20.0
-            frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            out = cv2.VideoWriter(st.session_state.video_file_path, fourcc, fps, (frame_width, frame_height))
+            skip_info = st.empty()
+            latency_info = st.empty()
+            latency = LatencyTracker()
+            out = None
+            recorder = None
 
-            while cap.isOpened() and st.session_state.live_classifying:
-                ret, frame = cap.read()
-                if not ret:
-                    st.error("⚠ Video feed lost.")
-                    break
+            try:
+                # Set up video writer
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Video codec
+                fps = 20.0
+                frame_width, frame_height = capture.frame_size
+                if record_full_stream:
+                    out = cv2.VideoWriter(st.session_state.video_file_path, fourcc, fps, (frame_width, frame_height))
+                if record_events:
+                    recorder = EventRecorder(st.session_state.clips_dir, (frame_width, frame_height), fps,
+                                             pre_seconds, post_seconds)
+
+                shown = 0
+                while st.session_state.live_classifying:
+                    with stage("capture"):
+                        ret, frame, captured_at = capture.read()
+                    if not ret:
+                        # A slow frame only times out the read; the feed is lost once the capture stops
+                        if capture.active:
+                            continue
+                        st.error("⚠ Video feed lost.")
+                        break
+
+                    # Predict class only when the content changed (resizing and colour conversion happen in memory)
+                    if detector is None or detector.should_infer(frame):
+                        class_name, confidence = classify_frame(frame)
+                    else:
+                        count("frames_skipped")
+                    if detector is not None and detector.frames % 30 == 0:
+                        skip_info.caption(f"Frames skipped: {detector.skip_ratio:.0%}")
+
+                    # Overlay text on frame
+                    cv2.putText(frame, f"{class_name} ({confidence:.2f})", 
+                                (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+                    # Convert OpenCV image to RGB
+                    with stage("render"):
+                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        stframe.image(frame_rgb, channels="RGB", use_container_width=True)
+                    latency.record(captured_at)
+
+                    shown += 1
+                    if shown % 30 == 0:
+                        latency_info.caption(
+                            f"Capture-to-label latency: {latency.mean_ms:.0f} ms (max {latency.max_ms:.0f} ms) | "
+                            f"dropped frames: {capture.dropped} of {capture.captured}"
+                        )
+
+                    # Save frame to video file
+                    with stage("encode"):
+                        if recorder is not None:
+                            recorder.push(frame, class_name, captured_at)
+                        if out is not None:
+                            out.write(frame)
+            finally:
+                # Runs on Stop too: Streamlit interrupts this script run to handle the button
+                capture.stop()
+                if recorder is not None:
+                    recorder.close()
+                if out is not None:
+                    out.release()
+            
 
-                # Resize frame for consistent processing
-                frame_resized = cv2.resize(frame, (64, 64))
+    else:
+        st.info("ℹ️ Press 'Start Classification' to begin.")
 
-                # Predict class
-                class_name, confidence = classify_frame(frame_resized)
+        clips = sorted(f for f in os.listdir(st.session_state.clips_dir) if f.endswith(".mp4"))
+        if clips:
+            with st.expander(f"🎬 Defect clips ({len(clips)})"):
+                for clip in clips:
+                    with open(os.path.join(st.session_state.clips_dir, clip), "rb") as f:
+                        st.download_button(f"⬇️ {clip}", f, clip, "video/mp4", key=clip)
 
-                # Overlay text on frame
-                cv2.putText(frame, f"{class_name} ({confidence:.2f})", 
-                            (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+ 
 
-                # Convert OpenCV image to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                stframe.image(frame_rgb, channels="RGB", use_container_width=True)
+# Option 4: several cameras classified with shared, fairly scheduled model calls
+elif selected_option == "Multi-Stream":
+    st.title("Multi-Stream Classification 🎥")
 
-                # Save frame to video file
-                out.write(frame)
+    if 'multi_classifying' not in st.session_state:
+        st.session_state.multi_classifying = False
 
-            cap.release()
-            
+    sources_text = st.text_area(
+        "Sources, one per line (camera index, video file or RTSP URL)", value="0",
+        disabled=st.session_state.multi_classifying,
+    )
+    sources = [line.strip() for line in sources_text.splitlines() if line.strip()]
 
+    start_button = st.button("▶ Start Streams")
+    stop_button = st.button("⏹ Stop Streams")
+    if start_button and sources:
+        st.session_state.multi_classifying = True
+    if stop_button:
+        st.session_state.multi_classifying = False
+
+    if st.session_state.multi_classifying:
+        latest = {}
+
+        def keep_latest(stream, frame, label, confidence):
+            # Called on the scheduler thread; the page loop below renders the newest result per stream
+            latest[stream] = (frame, label, confidence)
+
+        scheduler = MultiStreamScheduler(sources, VIDEO_BATCH_SIZE, on_result=keep_latest)
+        for source in scheduler.start():
+            st.warning(f"⚠ Could not open {source}")
+
+        columns = st.columns(min(len(sources), 3))
+        frames = [columns[i % len(columns)].empty() for i in range(len(sources))]
+        stats_table = st.empty()
+        try:
+            shown = 0
+            rendered = {}
+            while st.session_state.multi_classifying and scheduler.running:
+                for stream, result in list(latest.items()):
+                    if rendered.get(stream) is result:
+                        continue
+                    rendered[stream] = result
+                    frame, label, confidence = result
+                    frame = frame.copy()
+                    overlay_label(frame, label, confidence)
+                    with stage("render"):
+                        frames[stream].image(frame, channels="BGR", caption=str(sources[stream]))
+                shown += 1
+                if shown % 10 == 0:
+                    stats_table.table([
+                        {
+                            "source": str(row["source"]),
+                            "label": row["label"],
+                            "fps": f"{row['fps']:.1f}",
+                            "latency ms (mean / p95)": f"{row['latency_mean_ms']:.0f} / {row['latency_p95_ms']:.0f}",
+                            "dropped": f"{row['dropped']} of {row['captured']}",
+                        }
+                        for row in scheduler.snapshot()
+                    ])
+                time.sleep(0.05)
+            if scheduler.error is not None:
+                st.error(f"❌ Classification failed: {scheduler.error}")
+        finally:
+            # Runs on Stop too: Streamlit interrupts this script run to handle the button
+            scheduler.stop()
     else:
-        st.info("ℹ️ Press 'Start Classification' to begin.")
-
- 
+        st.info("ℹ️ Press 'Start Streams' to begin.")
 
 # Close main content wrapper
 st.markdown("</div>", unsafe_allow_html=True)
@@ -414,7 +584,7 @@ st.markdown(
                 <img src="https://upload.wikimedia.org/wikipedia/commons/4/4e/Gmail_Icon.png" alt="Gmail">
             </a>
             <a href="https://insightmindmatrix.com/" target="_blank" style="color:white;margin-left:70px;"><strong id="about">about us</strong>
-                <img src="data:image/png;base64,{_get_image_base64("logo.png")}" style="margin-left: 10px; width:70px; margin-bottom:15px;"> 
+                <img src="{asset_data_uri("logo.png", 70)}" style="margin-left: 10px; width:70px; margin-bottom:15px;"> 
             </a>
         </div>
         <p><i>© 2025 Textile Classification App. | All Rights Reserved to Insight Mind Matrix </i></p>
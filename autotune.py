@@ -0,0 +1,179 @@
+"""
+Find the fastest CPU inference settings for this host.
+
+Sweeps TensorFlow intra- and inter-op thread counts and core pinning, each in a fresh
+process (TensorFlow fixes its thread pools at start-up), and within each process every batch
+size. Every combination is timed for latency (p50/p95 per model call) and throughput. The
+winner is the highest-throughput combination whose p95 latency fits the budget; it is written
+to the config file, from which textile_core, the video engine and the webcam path pick it up at
+start-up.
+
+Usage:
+    python autotune.py [--latency-budget-ms 100] [--seconds 1.0] [--config textile_config.json] [--stand-in]
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+
+import numpy as np
+
+from settings import CONFIG_PATH, load_settings, save_settings
+
+BATCH_SIZES = (1, 4, 8, 16, 32, 64)
+
+
+def _thread_counts(cpus):
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def candidate_profiles(cpus=None):
+    """
+    Thread and pinning combinations to try.
+
+    Returns:
+        list: Dicts with `intra_op_threads`, `inter_op_threads` and `cpu_affinity` (None or CPU ids).
+    """
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    cpus = cpus or len(available)
+    profiles = []
+    for intra in _thread_counts(cpus):
+        for inter in (1, 2):
+            profiles.append({'intra_op_threads': intra, 'inter_op_threads': inter, 'cpu_affinity': None})
+            if hasattr(os, 'sched_setaffinity') and intra < cpus:
+                # Compact pinning: the pool's threads share caches instead of migrating across the host
+                profiles.append({'intra_op_threads': intra, 'inter_op_threads': inter,
+                                 'cpu_affinity': available[:intra]})
+    return profiles
+
+
+def _measure(profile, model_path, backend, stand_in, batch_sizes, seconds, results):
+    """Child process: apply one profile, load the model and time every batch size."""
+    from backends import KerasBackend, configure_threads, load_backend, pin_cpus
+
+    try:
+        pin_cpus(profile['cpu_affinity'])
+        configure_threads(profile['intra_op_threads'], profile['inter_op_threads'])
+        if stand_in:
+            from stand_in_model import build_stand_in_model
+            model = KerasBackend(build_stand_in_model())
+        else:
+            model = load_backend(backend, model_path, profile['intra_op_threads'])
+        model.warm_up()
+
+        rng = np.random.default_rng(0)
+        rows = []
+        for batch_size in batch_sizes:
+            batch = rng.uniform(-120, 150, (batch_size, *model.input_shape[1:])).astype(np.float32)
+            model.predict(batch)
+            latencies = []
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline or len(latencies) < 3:
+                start = time.perf_counter()
+                model.predict(batch)
+                latencies.append(time.perf_counter() - start)
+            latencies_ms = np.array(latencies) * 1000
+            rows.append({
+                **profile,
+                'batch_size': batch_size,
+                'p50_ms': float(np.percentile(latencies_ms, 50)),
+                'p95_ms': float(np.percentile(latencies_ms, 95)),
+                'images_per_s': batch_size * len(latencies) / (latencies_ms.sum() / 1000),
+            })
+        results.put(rows)
+    except Exception as e:
+        results.put(e)
+
+
+def sweep(profiles, model_path, backend, stand_in=False, batch_sizes=BATCH_SIZES, seconds=1.0, on_result=None):
+    """
+    Measure every profile in its own process.
+
+    Args:
+        on_result (callable, optional): Called with each measured row as results arrive.
+
+    Returns:
+        list: One row per (profile, batch size) with p50/p95 latency and throughput.
+    """
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for profile in profiles:
+        results = context.Queue()
+        process = context.Process(
+            target=_measure, args=(profile, model_path, backend, stand_in, batch_sizes, seconds, results)
+        )
+        process.start()
+        while True:
+            try:
+                outcome = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    outcome = RuntimeError(f"process exited with code {process.exitcode}")
+                    break
+        process.join()
+        if isinstance(outcome, Exception):
+            raise RuntimeError(f"Measuring {profile} failed: {outcome}")
+        for row in outcome:
+            rows.append(row)
+            if on_result is not None:
+                on_result(row)
+    return rows
+
+
+def pick_best(rows, latency_budget_ms):
+    """
+    Highest-throughput row whose p95 latency fits the budget.
+
+    Returns:
+        tuple: The chosen row and whether it met the budget; without any row in budget,
+            the lowest-latency row is returned instead.
+    """
+    within = [row for row in rows if row['p95_ms'] <= latency_budget_ms]
+    if within:
+        return max(within, key=lambda row: row['images_per_s']), True
+    return min(rows, key=lambda row: row['p95_ms']), False
+
+
+def _print_row(row):
+    pinned = f"cpus {row['cpu_affinity'][0]}-{row['cpu_affinity'][-1]}" if row['cpu_affinity'] else 'unpinned'
+    print(f"{row['intra_op_threads']:>6}{row['inter_op_threads']:>6}{pinned:>14}{row['batch_size']:>7}"
+          f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['images_per_s']:>12.1f}")
+
+
+def main():
+    settings = load_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-budget-ms', type=float, default=100.0, help='Maximum p95 latency of one model call')
+    parser.add_argument('--seconds', type=float, default=1.0, help='Measurement time per batch size')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES))
+    parser.add_argument('--model', default=settings['model_path'], help='Model artifact to tune for')
+    parser.add_argument('--backend', default=settings['backend'])
+    parser.add_argument('--stand-in', action='store_true', help='Tune with the tiny stand-in model')
+    parser.add_argument('--config', default=CONFIG_PATH, help='Config file the winning profile is written to')
+    parser.add_argument('--dry-run', action='store_true', help='Report the winner without writing it')
+    args = parser.parse_args()
+
+    profiles = candidate_profiles()
+    print(f"Trying {len(profiles)} thread/pinning profiles x {len(args.batch_sizes)} batch sizes")
+    print(f"{'intra':>6}{'inter':>6}{'pinning':>14}{'batch':>7}{'p50 ms':>10}{'p95 ms':>10}{'images/s':>12}")
+    rows = sweep(profiles, args.model, args.backend, args.stand_in, args.batch_sizes, args.seconds, _print_row)
+
+    best, within_budget = pick_best(rows, args.latency_budget_ms)
+    if not within_budget:
+        print(f"No setting meets the {args.latency_budget_ms:g} ms budget; choosing the lowest-latency one")
+    profile = {key: best[key] for key in ('batch_size', 'intra_op_threads', 'inter_op_threads', 'cpu_affinity')}
+    print(f"Best: {profile} ({best['images_per_s']:.1f} images/s, p95 {best['p95_ms']:.2f} ms)")
+    if not args.dry_run:
+        save_settings(profile, args.config)
+        print(f"Saved to {args.config}; applied at the next start of the apps")
+
+
+if __name__ == '__main__':
+    main()
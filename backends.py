@@ -0,0 +1,211 @@
+import os
+import threading
+
+import numpy as np
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Set TensorFlow's CPU thread pools. Must run before the process executes its first TensorFlow op.
+
+    Args:
+        intra_op_threads (int, optional): Threads used inside one op, e.g. a convolution.
+        inter_op_threads (int, optional): Independent ops run concurrently.
+    """
+    if not intra_op_threads and not inter_op_threads:
+        return
+    import tensorflow as tf
+
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def pin_cpus(cpus):
+    """
+    Restrict this process (and the threads it starts later) to the given CPU ids. No-op where unsupported.
+
+    Args:
+        cpus (sequence): CPU ids, e.g. [0, 1, 2, 3].
+
+    Returns:
+        bool: True if the affinity was applied.
+    """
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        return False
+    os.sched_setaffinity(0, set(cpus))
+    return True
+
+
+class Backend:
+    """
+    Common interface of the inference backends. `predict` takes a preprocessed float32
+    batch of shape (N, *input_shape) and returns class probabilities of shape (N, classes).
+    """
+
+    name = None
+
+    @property
+    def input_shape(self):
+        """Model input shape including the batch dimension, e.g. (None, 64, 64, 3)."""
+        raise NotImplementedError
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Run one inference so the first real request does not pay one-off setup costs."""
+        self.predict(np.zeros((1, *self.input_shape[1:]), dtype=np.float32))
+
+
+class KerasBackend(Backend):
+    """Full TensorFlow/Keras model, using the compiled small-batch path where it is faster."""
+
+    name = 'keras'
+
+    def __init__(self, model):
+        """
+        Args:
+            model (keras.Model): A loaded Keras model.
+        """
+        from compiled_predictor import CompiledPredictor
+
+        self.model = model
+        self.compiled = CompiledPredictor(model)
+
+    @classmethod
+    def load(cls, model_path, num_threads=None):
+        from tensorflow.keras.models import load_model
+
+        return cls(load_model(model_path))
+
+    @property
+    def input_shape(self):
+        return tuple(self.model.input_shape)
+
+    def predict(self, batch):
+        from compiled_predictor import SMALL_BATCH_LIMIT
+
+        if len(batch) <= SMALL_BATCH_LIMIT:
+            # Small batches: static-shape traced graph, no per-call model.predict overhead
+            return self.compiled.predict(batch)
+        return self.model.predict(batch, batch_size=SMALL_BATCH_LIMIT, verbose=0)
+
+    def warm_up(self):
+        self.compiled.warm_up()
+
+
+class TFLiteBackend(Backend):
+    """TensorFlow Lite model (float32, float16 or int8), run with the lightweight interpreter."""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Args:
+            model_path (str): Path to the .tflite file.
+            num_threads (int, optional): Interpreter CPU threads.
+        """
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        # The interpreter is not thread-safe and one instance serves sessions, the video engine and warm-up
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, model_path, num_threads=None):
+        return cls(model_path, num_threads)
+
+    @property
+    def input_shape(self):
+        return (None, *self._input['shape'][1:])
+
+    def _resize(self, batch_size):
+        """Resize the interpreter to a batch size; tensors are only reallocated when it changes. Call with the lock held."""
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input['index'], [batch_size, *self._input['shape'][1:]])
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(len(batch))
+            scale, zero_point = self._input['quantization']
+            if self._input['dtype'] != np.float32 and scale:
+                # Fully integer model: quantize the input with the model's own parameters
+                info = np.iinfo(self._input['dtype'])
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self._input['dtype'])
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+            output_dtype = self._output['dtype']
+            scale, zero_point = self._output['quantization']
+        if output_dtype != np.float32 and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+class ONNXBackend(Backend):
+    """ONNX Runtime model (float32 or int8-quantized) on the CPU execution provider."""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Args:
+            model_path (str): Path to the .onnx file.
+            num_threads (int, optional): Intra-op CPU threads.
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The 'onnx' backend needs onnxruntime: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self._input = self.session.get_inputs()[0]
+
+    @classmethod
+    def load(cls, model_path, num_threads=None):
+        return cls(model_path, num_threads)
+
+    @property
+    def input_shape(self):
+        return (None, *self._input.shape[1:])
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input.name: batch})[0]
+
+
+BACKENDS = {backend.name: backend for backend in (KerasBackend, TFLiteBackend, ONNXBackend)}
+
+
+def load_backend(name, model_path, num_threads=None):
+    """
+    Load a model with the named backend.
+
+    Args:
+        name (str): One of 'keras', 'tflite' or 'onnx'.
+        model_path (str): Path to the model artifact for that backend.
+        num_threads (int, optional): CPU threads for runtimes that support it.
+
+    Returns:
+        Backend: The loaded backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name].load(model_path, num_threads)
@@ -0,0 +1,184 @@
+"""
+Offline benchmark suite for the inference and video hot paths.
+
+Runs against a small stand-in Keras model with synthetic images and a synthetic video, so it
+needs neither the trained weights nor a camera. Results are written as JSON; `compare` flags
+metrics that regressed against a saved baseline by more than a tolerance.
+
+Usage:
+    python benchmark.py run [--output bench_results.json] [--baseline baseline.json]
+    python benchmark.py compare baseline.json bench_results.json [--tolerance 0.10]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+BATCH_SIZES = (1, 8, 32, 64, 128)
+
+
+def _metric(value, unit, better):
+    return {'value': float(value), 'unit': unit, 'better': better}
+
+
+def _latency_metrics(name, run, repeats):
+    """Time `run` repeatedly and return p50/p95/p99 latency metrics in milliseconds."""
+    run()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        f"{name}_p{q}_ms": _metric(np.percentile(samples, q), 'ms', 'lower') for q in (50, 95, 99)
+    }
+
+
+def _synthetic_video(path, frames, size=(640, 480), fps=20):
+    """Write a slowly changing synthetic fabric-like video."""
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 256, (size[1] * 2, size[0] * 2, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for i in range(frames):
+        # Pan across the texture like fabric moving past the camera
+        offset = (i * 3) % size[1]
+        writer.write(np.ascontiguousarray(texture[offset:offset + size[1], :size[0]]))
+    writer.release()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmarks(repeats=100, video_frames=300):
+    """
+    Run every benchmark and return the results.
+
+    Returns:
+        dict: Environment description and a `metrics` mapping of name -> {value, unit, better}.
+    """
+    from stand_in_model import use_stand_in_model
+
+    use_stand_in_model()
+    import textile_core
+    from video_engine import process_video
+
+    textile_core.warm_up(background=False)
+    rng = np.random.default_rng(0)
+    metrics = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_path = os.path.join(work_dir, 'sample.jpg')
+        Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)).save(image_path)
+        frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+        # Upload path: file decode + preprocessing + inference
+        metrics.update(_latency_metrics('predict_image', lambda: textile_core.predict_image(image_path), repeats))
+        # Webcam path used by classify_frame: in-memory frame + inference
+        metrics.update(_latency_metrics('classify_frame', lambda: textile_core.predict_frame(frame), repeats))
+
+        for batch_size in BATCH_SIZES:
+            images = [rng.integers(0, 256, (64, 64, 3), dtype=np.uint8) for _ in range(batch_size)]
+            textile_core.predict_batch(images, batch_size)
+            rounds = max(3, 512 // batch_size)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                textile_core.predict_batch(images, batch_size)
+            elapsed = time.perf_counter() - start
+            metrics[f"batch_{batch_size}_images_per_s"] = _metric(rounds * batch_size / elapsed, 'images/s', 'higher')
+
+        video_path = os.path.join(work_dir, 'input.mp4')
+        _synthetic_video(video_path, video_frames)
+        stats = process_video(video_path, os.path.join(work_dir, 'output.mp4'))
+        metrics['video_fps'] = _metric(stats['fps'], 'frames/s', 'higher')
+
+    metrics['peak_rss_mb'] = _metric(_peak_rss_mb(), 'MB', 'lower')
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'metrics': metrics,
+    }
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Compare two result sets.
+
+    Args:
+        baseline (dict): Earlier output of run_benchmarks.
+        current (dict): New output of run_benchmarks.
+        tolerance (float): Relative change allowed before a metric counts as a regression.
+
+    Returns:
+        list: (name, baseline value, current value, relative change, regressed) for shared metrics.
+    """
+    rows = []
+    for name, new in current['metrics'].items():
+        old = baseline['metrics'].get(name)
+        if old is None or old['value'] == 0:
+            continue
+        change = (new['value'] - old['value']) / old['value']
+        worse = change > tolerance if new['better'] == 'lower' else change < -tolerance
+        rows.append((name, old['value'], new['value'], change, worse))
+    return rows
+
+
+def _print_comparison(rows):
+    print(f"{'metric':<32}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, old, new, change, worse in rows:
+        print(f"{name:<32}{old:>12.2f}{new:>12.2f}{change:>+8.1%}{'  REGRESSION' if worse else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run the benchmarks')
+    run.add_argument('--output', default='bench_results.json', help='Where to write the results')
+    run.add_argument('--repeats', type=int, default=100, help='Timed calls per latency benchmark')
+    run.add_argument('--video-frames', type=int, default=300, help='Frames in the synthetic video')
+    run.add_argument('--baseline', help='Compare against this earlier results file')
+    run.add_argument('--tolerance', type=float, default=0.10)
+
+    check = commands.add_parser('compare', help='Compare two results files')
+    check.add_argument('baseline')
+    check.add_argument('current')
+    check.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative change')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run_benchmarks(args.repeats, args.video_frames)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        for name, metric in results['metrics'].items():
+            print(f"{name:<32}{metric['value']:>12.2f} {metric['unit']}")
+        if not args.baseline:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        current = results
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+
+    rows = compare(baseline, current, args.tolerance)
+    _print_comparison(rows)
+    if any(worse for *_, worse in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""
+Classify a large set of images from the command line.
+
+Inputs may be a directory (searched recursively), a glob pattern or a .zip / .tar(.gz/.bz2/.xz)
+archive. Images are decoded and resized in a process pool, classified in batches, and the
+results are appended to a CSV or JSON Lines file as they are produced. The output file is
+also the checkpoint: re-running the same command skips every image already written to it.
+
+Usage:
+    python bulk_classify.py INPUT OUTPUT.csv|OUTPUT.jsonl [--workers N] [--batch-size 64]
+"""
+import argparse
+import csv
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+FIELDS = ('image', 'label', 'confidence', 'error')
+
+# Model input size as (height, width); kept here so decode workers never import TensorFlow
+IMG_SIZE = (64, 64)
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_images(source, limit=None):
+    """
+    Enumerate the images of a directory (recursively), glob pattern or archive.
+
+    Args:
+        source (str): Directory, glob pattern or .zip / .tar archive.
+        limit (int, optional): Return at most this many, the first in sorted order.
+
+    Returns:
+        list: Image identifiers (file paths, or member names for archives), sorted.
+    """
+    if os.path.isdir(source):
+        names = (
+            os.path.join(root, name)
+            for root, _, names in os.walk(source) for name in names if _is_image(name)
+        )
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [name for name in archive.namelist() if _is_image(name)]
+    elif os.path.isfile(source) and tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            names = [member.name for member in archive if member.isfile() and _is_image(member.name)]
+    else:
+        names = (path for path in glob.glob(source, recursive=True) if _is_image(path))
+    names = sorted(names)
+    return names[:limit] if limit else names
+
+
+def _iter_payloads(source, names):
+    """Yield (name, path or bytes) in the order decoding should be submitted."""
+    wanted = set(names)
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in names:
+                yield name, archive.read(name)
+    elif os.path.isfile(source) and tarfile.is_tarfile(source):
+        # Stream the archive once in storage order; random access into compressed tars is slow
+        with tarfile.open(source, mode='r|*') as archive:
+            for member in archive:
+                if member.name in wanted:
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        for name in names:
+            yield name, name
+
+
+def decode(item):
+    """
+    Decode and resize one image in a worker process, the same way textile_core's load_img path does.
+
+    Args:
+        item (tuple): (name, path or encoded bytes).
+
+    Returns:
+        tuple: (name, uint8 array of the model input size or None, error message or None).
+    """
+    name, payload = item
+    try:
+        image = Image.open(io.BytesIO(payload) if isinstance(payload, bytes) else payload)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image = image.resize(IMG_SIZE[::-1], Image.NEAREST)
+        return name, np.asarray(image, dtype=np.uint8), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def load_labelled_folder(directory):
+    """
+    Decode a folder with one subfolder of images per class, e.g. DATA/Good, DATA/Hole, ...
+
+    Returns:
+        tuple: uint8 array of shape (N, height, width, 3) and array of the N class names.
+    """
+    images, labels = [], []
+    for label in sorted(os.listdir(directory)):
+        class_dir = os.path.join(directory, label)
+        if not os.path.isdir(class_dir):
+            continue
+        for path in list_images(class_dir):
+            _, image, error = decode((path, path))
+            if error is None:
+                images.append(image)
+                labels.append(label)
+    if not images:
+        return np.empty((0, *IMG_SIZE, 3), dtype=np.uint8), np.asarray(labels)
+    return np.stack(images), np.asarray(labels)
+
+
+class ResultWriter:
+    """Appends results to CSV or JSON Lines and reads back what an earlier run already finished."""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = 'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv'
+
+    def completed(self):
+        """Names already present in the output file, after dropping a partially written last line."""
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            if content and not content.endswith(b'\n'):
+                f.truncate(content.rfind(b'\n') + 1)
+        with open(self.path, newline='') as f:
+            if self.format == 'jsonl':
+                return {json.loads(line)['image'] for line in f if line.strip()}
+            return {row['image'] for row in csv.DictReader(f)}
+
+    def __enter__(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='')
+        if self.format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS)
+            if new_file:
+                self._csv.writeheader()
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def write(self, rows):
+        """Write a batch of result rows and flush them to disk so they survive an interruption."""
+        for row in rows:
+            if self.format == 'csv':
+                self._csv.writerow(row)
+            else:
+                self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+def run(source, output, workers=None, batch_size=64, progress_every=5.0):
+    """
+    Classify every image of `source` not yet present in `output`.
+
+    Returns:
+        dict: Number of images processed in this run, failures, elapsed seconds and images per second.
+    """
+    from textile_core import predict_batch
+
+    writer = ResultWriter(output)
+    done = writer.completed()
+    names = [name for name in list_images(source) if name not in done]
+    total = len(names)
+    print(f"{len(done)} images already classified, {total} to go", file=sys.stderr)
+
+    processed = failed = 0
+    start = last_report = time.perf_counter()
+    pending = deque()
+    # Bound the decoded images held in memory while inference catches up
+    max_pending = (workers or os.cpu_count() or 1) * batch_size * 2
+    batch_names, batch_images, rows = [], [], []
+
+    def flush():
+        nonlocal processed
+        if batch_images:
+            labels, confidences = predict_batch(batch_images, batch_size)
+            rows.extend(
+                {'image': name, 'label': str(label), 'confidence': round(float(confidence), 6), 'error': ''}
+                for name, label, confidence in zip(batch_names, labels, confidences)
+            )
+        writer.write(rows)
+        processed += len(rows)
+        batch_names.clear()
+        batch_images.clear()
+        rows.clear()
+
+    # Spawned workers only import PIL and NumPy, never the TensorFlow state of this process
+    context = multiprocessing.get_context('spawn')
+    with writer, ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        payloads = _iter_payloads(source, names)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                item = next(payloads, None)
+                if item is None:
+                    exhausted = True
+                else:
+                    pending.append(pool.submit(decode, item))
+            if not pending:
+                break
+
+            name, image, error = pending.popleft().result()
+            if error is None:
+                batch_names.append(name)
+                batch_images.append(image)
+            else:
+                failed += 1
+                rows.append({'image': name, 'label': '', 'confidence': '', 'error': error})
+            if len(batch_images) == batch_size:
+                flush()
+
+            now = time.perf_counter()
+            if now - last_report >= progress_every:
+                rate = processed / (now - start)
+                print(f"{processed}/{total} images, {rate:.1f} images/s", file=sys.stderr)
+                last_report = now
+        flush()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'images': processed,
+        'failed': failed,
+        'seconds': elapsed,
+        'images_per_second': processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='Directory, glob pattern or .zip/.tar archive of images')
+    parser.add_argument('output', help='Results file; .jsonl for JSON Lines, anything else for CSV')
+    parser.add_argument('--workers', type=int, help='Decode processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=64, help='Images per inference call')
+    parser.add_argument('--progress-every', type=float, default=5.0, help='Seconds between progress reports')
+    args = parser.parse_args()
+
+    stats = run(args.source, args.output, args.workers, args.batch_size, args.progress_every)
+    print(f"Classified {stats['images']} images ({stats['failed']} failed) in {stats['seconds']:.1f}s, "
+          f"{stats['images_per_second']:.1f} images/s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Cheap "Good" pre-filter ahead of the full model.
+
+Almost all fabric is defect-free, so a statistical texture check scores each input first: a
+handful of grayscale statistics (brightness, contrast, edge energy and the worst local
+deviation of 8x8 blocks) are compared with their distribution over known-good images. Inputs
+whose largest deviation stays below a calibrated threshold are labelled "Good" without a model
+call; everything else is escalated to EfficientNet.
+
+Calibrate on a labelled folder (one subfolder per class, e.g. DATA/Good, DATA/Hole, ...):
+    python cascade.py calibrate DATA [--miss-rate 0.01] [--output cascade.json]
+
+then enable the gate with `"cascade_path": "cascade.json"` in textile_config.json.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from settings import load_settings
+
+GOOD_LABEL = 'Good'
+
+# Side of the square blocks whose local statistics catch small spots and holes
+BLOCK = 8
+
+FEATURES = ('mean', 'std', 'edge_energy', 'block_mean_deviation', 'block_std_deviation')
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def texture_features(rgb):
+    """
+    Compute the texture statistics of a batch.
+
+    Args:
+        rgb (np.ndarray): RGB images of shape (N, H, W, 3), uint8 or float in [0, 255].
+
+    Returns:
+        np.ndarray: float32 array of shape (N, len(FEATURES)).
+    """
+    gray = np.asarray(rgb, dtype=np.float32) @ _LUMA
+    n, height, width = gray.shape
+    mean = gray.mean(axis=(1, 2))
+    std = gray.std(axis=(1, 2))
+    # 4-neighbour Laplacian on the interior: threads, holes and stains change the edge energy
+    laplacian = (4 * gray[:, 1:-1, 1:-1] - gray[:, :-2, 1:-1] - gray[:, 2:, 1:-1]
+                 - gray[:, 1:-1, :-2] - gray[:, 1:-1, 2:])
+    edge_energy = np.abs(laplacian).mean(axis=(1, 2))
+
+    rows, cols = height // BLOCK, width // BLOCK
+    blocks = gray[:, :rows * BLOCK, :cols * BLOCK].reshape(n, rows, BLOCK, cols, BLOCK)
+    block_mean = blocks.mean(axis=(2, 4))
+    block_std = blocks.std(axis=(2, 4))
+    block_mean_deviation = np.abs(block_mean - mean[:, None, None]).max(axis=(1, 2))
+    block_std_deviation = np.abs(block_std - block_std.mean(axis=(1, 2))[:, None, None]).max(axis=(1, 2))
+    return np.stack([mean, std, edge_energy, block_mean_deviation, block_std_deviation], axis=1)
+
+
+class TextureCascade:
+    """
+    Statistical gate returning "Good" for inputs that look like the known-good reference.
+
+    The score of an input is its largest absolute z-score over FEATURES; a score below the
+    threshold is accepted as Good, anything else needs the full model.
+    """
+
+    def __init__(self, reference_mean, reference_std, threshold, confidence=1.0):
+        """
+        Args:
+            reference_mean (sequence): Mean of each feature over known-good images.
+            reference_std (sequence): Standard deviation of each feature over known-good images.
+            threshold (float): Scores strictly below this are accepted as Good.
+            confidence (float): Confidence reported for accepted inputs, i.e. the share of
+                calibration inputs accepted by the gate that really were Good.
+        """
+        self.reference_mean = np.asarray(reference_mean, dtype=np.float32)
+        self.reference_std = np.maximum(np.asarray(reference_std, dtype=np.float32), 1e-6)
+        self.threshold = float(threshold)
+        self.confidence = float(confidence)
+        # File the gate was loaded from, if any
+        self.path = None
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.escalated = 0
+
+    @classmethod
+    def fit(cls, good_rgb, threshold=float('inf')):
+        """Build a gate from the feature distribution of known-good images."""
+        features = texture_features(good_rgb)
+        return cls(features.mean(axis=0), features.std(axis=0), threshold)
+
+    def scores(self, rgb):
+        """Anomaly score of every image in a batch of shape (N, H, W, 3)."""
+        if len(rgb) == 0:
+            return np.empty(0, dtype=np.float32)
+        z = (texture_features(rgb) - self.reference_mean) / self.reference_std
+        return np.abs(z).max(axis=1)
+
+    def accept(self, rgb):
+        """
+        Decide which images can skip the full model.
+
+        Returns:
+            np.ndarray: Boolean mask, True for images confidently Good.
+        """
+        mask = self.scores(rgb) < self.threshold
+        accepted = int(mask.sum())
+        with self._lock:
+            self.accepted += accepted
+            self.escalated += len(mask) - accepted
+        return mask
+
+    def stats(self):
+        """Inputs answered by the gate, inputs escalated, and the share of model calls saved."""
+        with self._lock:
+            total = self.accepted + self.escalated
+            return {
+                'accepted': self.accepted,
+                'escalated': self.escalated,
+                'saved_ratio': self.accepted / total if total else 0.0,
+            }
+
+    def to_dict(self):
+        return {
+            'features': list(FEATURES),
+            'reference_mean': self.reference_mean.tolist(),
+            'reference_std': self.reference_std.tolist(),
+            'threshold': self.threshold,
+            'confidence': self.confidence,
+        }
+
+    def fingerprint(self):
+        """Identify the calibration (reference statistics and thresholds) this gate answers with."""
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('features') != list(FEATURES):
+            raise ValueError(f"{path} was calibrated with different features; recalibrate it")
+        gate = cls(data['reference_mean'], data['reference_std'], data['threshold'], data['confidence'])
+        gate.path = path
+        return gate
+
+
+def pick_threshold(defect_scores, miss_rate):
+    """
+    Largest threshold that lets at most `miss_rate` of the defective images through as Good.
+
+    Args:
+        defect_scores (np.ndarray): Scores of known-defective images.
+        miss_rate (float): Tolerated share of defects accepted as Good.
+
+    Returns:
+        float: The threshold; images scoring strictly below it are accepted.
+    """
+    scores = np.sort(np.asarray(defect_scores, dtype=np.float64))
+    if len(scores) == 0:
+        raise ValueError("Calibration needs defective images to bound the miss rate")
+    allowed_misses = int(np.floor(miss_rate * len(scores)))
+    return float(scores[min(allowed_misses, len(scores) - 1)])
+
+
+def calibrate(directory, miss_rate=0.01, seed=0):
+    """
+    Fit a gate on half of the Good images, pick its threshold on half of the defective ones for
+    a target miss rate, and measure it on the other halves.
+
+    Args:
+        directory (str): Labelled folder, one subfolder per class.
+        miss_rate (float): Tolerated share of defects accepted as Good.
+        seed (int): Seed of the splits between calibration and held-out images.
+
+    Returns:
+        tuple: The TextureCascade and a report of its behaviour on the held-out images.
+    """
+    from bulk_classify import load_labelled_folder
+
+    images, labels = load_labelled_folder(directory)
+    good = np.flatnonzero(labels == GOOD_LABEL)
+    defects = np.flatnonzero(labels != GOOD_LABEL)
+    if len(good) < 2:
+        raise ValueError(f"Need at least two images in {os.path.join(directory, GOOD_LABEL)}")
+    if len(defects) < 2:
+        raise ValueError(f"Need at least two defective images in {directory} to bound the miss rate")
+    rng = np.random.default_rng(seed)
+    good, defects = rng.permutation(good), rng.permutation(defects)
+    fit_good, held_out_good = good[:len(good) // 2], good[len(good) // 2:]
+    calibration_defects, held_out_defects = defects[:len(defects) // 2], defects[len(defects) // 2:]
+
+    gate = TextureCascade.fit(images[fit_good])
+    gate.threshold = pick_threshold(gate.scores(images[calibration_defects]), miss_rate)
+
+    # Evaluate on images neither the reference statistics nor the threshold were fitted on
+    good_accepted = int((gate.scores(images[held_out_good]) < gate.threshold).sum())
+    defects_accepted = int((gate.scores(images[held_out_defects]) < gate.threshold).sum())
+    accepted = good_accepted + defects_accepted
+    gate.confidence = good_accepted / accepted if accepted else 1.0
+    evaluated = len(held_out_good) + len(held_out_defects)
+    report = {
+        'threshold': gate.threshold,
+        'good_images': len(held_out_good),
+        'defect_images': len(held_out_defects),
+        'calibration_defect_images': len(calibration_defects),
+        'miss_rate': defects_accepted / len(held_out_defects),
+        'good_accepted_ratio': good_accepted / len(held_out_good),
+        'calls_saved_ratio': accepted / evaluated,
+        'precision': gate.confidence,
+    }
+    return gate, report
+
+
+_default_cascade = None
+_default_loaded = False
+_default_lock = threading.Lock()
+
+
+def get_cascade():
+    """Return the process-wide gate configured by `cascade_path` in the settings, or None when disabled."""
+    global _default_cascade, _default_loaded
+    if not _default_loaded:
+        with _default_lock:
+            if not _default_loaded:
+                path = load_settings().get('cascade_path')
+                _default_cascade = TextureCascade.load(path) if path else None
+                _default_loaded = True
+    return _default_cascade
+
+
+def set_cascade(gate):
+    """Install a gate (or None to disable it) for this process, overriding the settings."""
+    global _default_cascade, _default_loaded
+    with _default_lock:
+        _default_cascade = gate
+        _default_loaded = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('calibrate', help='Fit the gate and pick its threshold on a labelled folder')
+    run.add_argument('directory', help='Folder with one subfolder of images per class')
+    run.add_argument('--miss-rate', type=float, default=0.01, help='Tolerated share of defects accepted as Good')
+    run.add_argument('--output', default='cascade.json', help='Where to write the calibrated gate')
+    run.add_argument('--seed', type=int, default=0, help='Seed of the calibration/held-out split')
+    args = parser.parse_args()
+
+    gate, report = calibrate(args.directory, args.miss_rate, args.seed)
+    gate.save(args.output)
+    print(f"Threshold:             {report['threshold']:.3f}")
+    print(f"Defect miss rate:      {report['miss_rate']:.2%} of {report['defect_images']} held-out defective images "
+          f"(threshold set on {report['calibration_defect_images']})")
+    print(f"Good accepted:         {report['good_accepted_ratio']:.2%} of {report['good_images']} held-out Good images")
+    print(f"Model calls saved:     {report['calls_saved_ratio']:.2%} of the held-out images")
+    print(f"Gate precision:        {report['precision']:.2%}")
+    print(f"Saved to {args.output}; enable it with \"cascade_path\" in textile_config.json")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+
+# Mean absolute grey-level difference (0-255) above which a frame counts as changed
+DEFAULT_THRESHOLD = 4.0
+
+# Maximum number of consecutive frames that may reuse the previous label
+DEFAULT_MAX_STALENESS = 30
+
+# Size of the downsampled greyscale signature compared between frames, as (width, height)
+SIGNATURE_SIZE = (32, 32)
+
+
+def frame_signature(frame, size=SIGNATURE_SIZE):
+    """
+    Compute a cheap signature of a BGR frame for change detection.
+
+    Args:
+        frame (np.ndarray): uint8 BGR frame of shape (H, W, 3).
+        size (tuple): Signature size as (width, height).
+
+    Returns:
+        np.ndarray: Downsampled greyscale float32 image.
+    """
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.float32)
+
+
+class ChangeDetector:
+    """
+    Decides whether a frame differs enough from the last classified frame to be worth
+    sending to the model. Frames are compared against the last frame that was actually
+    classified, so slow drift still triggers inference once it adds up.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_staleness=DEFAULT_MAX_STALENESS, size=SIGNATURE_SIZE):
+        """
+        Args:
+            threshold (float): Mean absolute grey-level difference that counts as a change.
+            max_staleness (int): Force inference after this many consecutive skipped frames.
+            size (tuple): Signature size as (width, height).
+        """
+        if threshold < 0 or max_staleness < 0:
+            raise ValueError("threshold and max_staleness must not be negative")
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        """Forget the reference frame and statistics."""
+        self._reference = None
+        self._stale_frames = 0
+        self.frames = 0
+        self.inferred = 0
+
+    def difference(self, signature):
+        """Mean absolute difference between a signature and the reference frame."""
+        if self._reference is None:
+            return float("inf")
+        return float(np.mean(np.abs(signature - self._reference)))
+
+    def should_infer(self, frame):
+        """
+        Check a frame and update the detector state.
+
+        Args:
+            frame (np.ndarray): uint8 BGR frame of shape (H, W, 3).
+
+        Returns:
+            bool: True if the model should classify this frame, False if the last label can be reused.
+        """
+        signature = frame_signature(frame, self.size)
+        self.frames += 1
+        if self._stale_frames >= self.max_staleness or self.difference(signature) > self.threshold:
+            self._reference = signature
+            self._stale_frames = 0
+            self.inferred += 1
+            return True
+        self._stale_frames += 1
+        return False
+
+    @property
+    def skip_ratio(self):
+        """Fraction of frames that reused the previous label."""
+        if self.frames == 0:
+            return 0.0
+        return 1.0 - self.inferred / self.frames
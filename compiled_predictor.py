@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+# Batch sizes with a dedicated traced graph; smaller batches are zero-padded up to the next one
+BATCH_BUCKETS = (1, 4, 8, 16, 32, 64)
+
+# Batches larger than this go through model.predict, which pipelines big offline jobs better
+SMALL_BATCH_LIMIT = BATCH_BUCKETS[-1]
+
+
+class CompiledPredictor:
+    """
+    Low-latency forward pass for small batches.
+
+    model.predict builds a data adapter, callbacks and a progress bar on every call, which
+    dominates the latency of a single 64x64 image. This class traces the model once per
+    batch bucket with a fully static input signature and calls the resulting concrete
+    function directly, so no call ever retraces.
+    """
+
+    def __init__(self, model, buckets=BATCH_BUCKETS):
+        """
+        Args:
+            model (keras.Model): The model to wrap.
+            buckets (tuple): Ascending batch sizes to trace.
+        """
+        self.model = model
+        self.buckets = tuple(sorted(buckets))
+        self._input_shape = tuple(model.input_shape[1:])
+        self._forward = tf.function(lambda x: model(x, training=False))
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def _function_for(self, bucket):
+        """Return the concrete function for a bucket, tracing it on first use."""
+        function = self._functions.get(bucket)
+        if function is None:
+            with self._lock:
+                function = self._functions.get(bucket)
+                if function is None:
+                    spec = tf.TensorSpec((bucket, *self._input_shape), tf.float32)
+                    function = self._forward.get_concrete_function(spec)
+                    self._functions[bucket] = function
+        return function
+
+    def _bucket_for(self, size):
+        for bucket in self.buckets:
+            if size <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def warm_up(self):
+        """Trace and run every bucket once so later calls never pay tracing cost."""
+        for bucket in self.buckets:
+            self._function_for(bucket)(tf.zeros((bucket, *self._input_shape), tf.float32))
+
+    def predict(self, batch):
+        """
+        Run the model on a preprocessed batch.
+
+        Args:
+            batch (np.ndarray): float32 array of shape (N, *input_shape).
+
+        Returns:
+            np.ndarray: Class probabilities of shape (N, num_classes).
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            size = len(chunk)
+            bucket = self._bucket_for(size)
+            if size < bucket:
+                padded = np.zeros((bucket, *self._input_shape), dtype=np.float32)
+                padded[:size] = chunk
+                chunk = padded
+            outputs.append(self._function_for(bucket)(tf.constant(chunk)).numpy()[:size])
+        return np.concatenate(outputs) if outputs else np.empty((0, *self.model.output_shape[1:]), np.float32)
+
+
+def _compare_latency(model, batch_sizes=(1, 8, 64), repeats=50):
+    """Print mean latency of model.predict against the compiled path for a few batch sizes."""
+    import time
+
+    predictor = CompiledPredictor(model)
+    predictor.warm_up()
+    print(f"{'batch':>6}{'model.predict (ms)':>22}{'compiled (ms)':>17}{'speed-up':>10}")
+    for size in batch_sizes:
+        batch = np.random.default_rng(0).uniform(-120, 150, (size, *model.input_shape[1:])).astype(np.float32)
+        model.predict(batch, verbose=0)
+        timings = []
+        for run in (lambda: model.predict(batch, verbose=0), lambda: predictor.predict(batch)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                run()
+            timings.append((time.perf_counter() - start) / repeats * 1000)
+        print(f"{size:>6}{timings[0]:>22.2f}{timings[1]:>17.2f}{timings[0] / timings[1]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from model_manager import MODEL_PATH, ModelManager
+
+    parser = argparse.ArgumentParser(description='Compare model.predict with the compiled small-batch path.')
+    parser.add_argument('--model', default=MODEL_PATH, help='Path to the Keras model')
+    parser.add_argument('--repeats', type=int, default=50, help='Timed calls per batch size')
+    args = parser.parse_args()
+    _compare_latency(ModelManager(args.model, backend='keras').get().model, repeats=args.repeats)
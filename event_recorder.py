@@ -0,0 +1,116 @@
+import os
+import time
+from collections import deque
+
+import cv2
+
+# Seconds of video kept before and after a defect in each clip
+DEFAULT_PRE_SECONDS = 5.0
+DEFAULT_POST_SECONDS = 5.0
+
+# Highest frame rate the pre-event buffer is sized for
+MAX_FPS = 30.0
+
+# Recent frames the delivery rate is measured over
+RATE_WINDOW = 60
+
+
+def is_defect(label):
+    """Default trigger: every class except "Good"."""
+    return label != 'Good'
+
+
+class EventRecorder:
+    """
+    Records short clips around defects instead of the whole live stream.
+
+    Recent frames are kept in a bounded in-memory ring buffer. When a frame's label triggers
+    an event, the buffered frames are written to a new clip and recording continues until
+    `post_seconds` pass without another trigger. Only event frames are ever encoded.
+
+    Frames arrive at whatever rate the inference loop manages, usually well below the camera's,
+    so the windows are measured on the frames' capture timestamps and each clip is written at
+    the delivery rate measured when it starts, making it play back in real time.
+    """
+
+    def __init__(self, output_dir, frame_size, fps=20.0, pre_seconds=DEFAULT_PRE_SECONDS,
+                 post_seconds=DEFAULT_POST_SECONDS, trigger=is_defect, max_fps=MAX_FPS):
+        """
+        Args:
+            output_dir (str): Directory for the clips.
+            frame_size (tuple): (width, height) of the frames.
+            fps (float): Frame rate written into a clip that starts before the rate could be measured.
+            pre_seconds (float): Video kept before the first triggering frame.
+            post_seconds (float): Video kept after the last triggering frame.
+            trigger (callable): Maps a label to True when it should start or extend a clip.
+            max_fps (float): Highest expected delivery rate; bounds the frames the buffer may hold.
+        """
+        self.output_dir = output_dir
+        self.frame_size = frame_size
+        self.fps = fps
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.trigger = trigger
+        self._buffer = deque(maxlen=max(int(pre_seconds * max_fps), 1))
+        self._arrivals = deque(maxlen=RATE_WINDOW)
+        self._writer = None
+        self._last_trigger = None
+        self.clips = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def recording(self):
+        """True while a clip is being written."""
+        return self._writer is not None
+
+    @property
+    def measured_fps(self):
+        """Rate at which frames have recently been pushed, or `fps` until there are enough of them."""
+        if len(self._arrivals) < 2 or self._arrivals[-1] <= self._arrivals[0]:
+            return self.fps
+        return (len(self._arrivals) - 1) / (self._arrivals[-1] - self._arrivals[0])
+
+    def push(self, frame, label, timestamp=None):
+        """
+        Add the next frame of the stream.
+
+        Args:
+            frame (np.ndarray): BGR frame, usually already annotated with its label.
+            label (str): Predicted class of the frame.
+            timestamp (float, optional): time.perf_counter() at capture; defaults to now.
+        """
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        self._arrivals.append(timestamp)
+        triggered = self.trigger(label)
+        if self._writer is None:
+            if not triggered:
+                self._buffer.append((timestamp, frame))
+                while timestamp - self._buffer[0][0] > self.pre_seconds:
+                    self._buffer.popleft()
+                return
+            self._open(label)
+            for _, buffered in self._buffer:
+                self._writer.write(buffered)
+            self._buffer.clear()
+
+        self._writer.write(frame)
+        if triggered:
+            self._last_trigger = timestamp
+        elif timestamp - self._last_trigger >= self.post_seconds:
+            self._close()
+
+    def _open(self, label):
+        name = f"event_{time.strftime('%Y%m%d_%H%M%S')}_{len(self.clips):04d}_{label.replace(' ', '_')}.mp4"
+        path = os.path.join(self.output_dir, name)
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), self.measured_fps, self.frame_size)
+        self.clips.append(path)
+
+    def _close(self):
+        self._writer.release()
+        self._writer = None
+
+    def close(self):
+        """Finish the clip in progress, if any, and drop the buffered frames."""
+        if self._writer is not None:
+            self._close()
+        self._buffer.clear()
@@ -0,0 +1,162 @@
+"""
+Export the Keras model to lighter inference backends and check them against it.
+
+Commands:
+    export  Convert the .h5 model into float16 and int8 TFLite models and float32 and int8 ONNX models.
+            int8 conversion calibrates activation ranges on a folder of representative images.
+    parity  Compare a converted model with the Keras model on a folder of images and report
+            label agreement and confidence drift.
+
+Examples:
+    python export_model.py export --calibration-dir samples/ --out-dir models/
+    python export_model.py parity --backend tflite --candidate models/TILDA_int8.tflite --images samples/
+
+Select an exported model without code changes through textile_config.json
+({"backend": "tflite", "model_path": "models/TILDA_int8.tflite"}) or the
+TEXTILE_BACKEND and TEXTILE_MODEL_PATH environment variables.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from backends import KerasBackend, load_backend
+from bulk_classify import list_images
+from model_manager import MODEL_PATH
+
+def _calibration_batches(folder, limit):
+    """Preprocessed single-image batches for calibration, in the exact format the model sees."""
+    from textile_core import preprocess_batch
+
+    paths = list_images(folder, limit)
+    if not paths:
+        raise ValueError(f"No images found in {folder}")
+    for path in paths:
+        yield preprocess_batch([path])
+
+
+def export_tflite(model, out_dir, stem, calibration_dir, calibration_size):
+    """Write float16 and int8 TFLite models and return their paths."""
+    import tensorflow as tf
+
+    paths = []
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    paths.append(_write(os.path.join(out_dir, f"{stem}_float16.tflite"), converter.convert()))
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = lambda: ([batch] for batch in _calibration_batches(calibration_dir, calibration_size))
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Weights and activations are int8; the float32 interface keeps preprocessing unchanged
+    paths.append(_write(os.path.join(out_dir, f"{stem}_int8.tflite"), converter.convert()))
+    return paths
+
+
+def export_onnx(model, out_dir, stem, calibration_dir, calibration_size):
+    """Write float32 and statically int8-quantized ONNX models and return their paths."""
+    try:
+        import tf2onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError:
+        raise RuntimeError("ONNX export needs tf2onnx and onnxruntime: pip install tf2onnx onnxruntime")
+    import tensorflow as tf
+
+    float_path = os.path.join(out_dir, f"{stem}.onnx")
+    signature = [tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=signature, output_path=float_path)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = _calibration_batches(calibration_dir, calibration_size)
+
+        def get_next(self):
+            batch = next(self._batches, None)
+            return None if batch is None else {'input': batch}
+
+    int8_path = os.path.join(out_dir, f"{stem}_int8.onnx")
+    quantize_static(float_path, int8_path, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+    return [float_path, int8_path]
+
+
+def _write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def parity(reference, candidate, image_paths, batch_size=32):
+    """
+    Compare two backends on the same preprocessed images.
+
+    Args:
+        reference (Backend): Usually the Keras model.
+        candidate (Backend): Converted model to check.
+        image_paths (list): Images to classify.
+        batch_size (int): Images per inference call.
+
+    Returns:
+        dict: Label agreement ratio and mean / max absolute drift of the reference's top-class confidence.
+    """
+    from textile_core import preprocess_batch
+
+    agree, drifts = 0, []
+    for start in range(0, len(image_paths), batch_size):
+        batch = preprocess_batch(image_paths[start:start + batch_size])
+        expected = reference.predict(batch)
+        actual = candidate.predict(batch)
+        labels = np.argmax(expected, axis=1)
+        agree += int(np.sum(labels == np.argmax(actual, axis=1)))
+        rows = np.arange(len(labels))
+        drifts.append(np.abs(expected[rows, labels] - actual[rows, labels]))
+    drifts = np.concatenate(drifts)
+    return {
+        'images': len(image_paths),
+        'label_agreement': agree / len(image_paths),
+        'mean_confidence_drift': float(np.mean(drifts)),
+        'max_confidence_drift': float(np.max(drifts)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Convert the Keras model to TFLite and ONNX')
+    export.add_argument('--model', default=MODEL_PATH, help='Path to the Keras .h5 model')
+    export.add_argument('--out-dir', default='models', help='Directory for the exported models')
+    export.add_argument('--calibration-dir', required=True, help='Folder of representative images for int8')
+    export.add_argument('--calibration-size', type=int, default=200, help='Maximum calibration images')
+    export.add_argument('--formats', nargs='+', choices=['tflite', 'onnx'], default=['tflite', 'onnx'])
+
+    check = commands.add_parser('parity', help='Compare a converted model with the Keras model')
+    check.add_argument('--model', default=MODEL_PATH, help='Path to the reference Keras .h5 model')
+    check.add_argument('--backend', required=True, choices=['tflite', 'onnx'], help='Backend of the candidate')
+    check.add_argument('--candidate', required=True, help='Path to the converted model')
+    check.add_argument('--images', required=True, help='Folder of images to compare on')
+    check.add_argument('--limit', type=int, help='Maximum number of images')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        os.makedirs(args.out_dir, exist_ok=True)
+        model = KerasBackend.load(args.model).model
+        stem = os.path.splitext(os.path.basename(args.model))[0]
+        exporters = {'tflite': export_tflite, 'onnx': export_onnx}
+        for name in args.formats:
+            for path in exporters[name](model, args.out_dir, stem, args.calibration_dir, args.calibration_size):
+                print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    else:
+        paths = list_images(args.images, args.limit)
+        if not paths:
+            parser.error(f"No images found in {args.images}")
+        report = parity(KerasBackend.load(args.model), load_backend(args.backend, args.candidate), paths)
+        print(f"Images compared:       {report['images']}")
+        print(f"Label agreement:       {report['label_agreement']:.2%}")
+        print(f"Mean confidence drift: {report['mean_confidence_drift']:.4f}")
+        print(f"Max confidence drift:  {report['max_confidence_drift']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
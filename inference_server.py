@@ -0,0 +1,243 @@
+"""
+Headless HTTP inference service with dynamic micro-batching.
+
+Concurrent requests are queued and grouped into micro-batches of at most --max-batch-size
+images, waiting at most --max-wait-ms for a batch to fill. Each batch costs one model call
+and the results are fanned back out to the waiting requests.
+
+Endpoints:
+    POST /predict        Raw image bytes or a multipart form with one image file
+    POST /predict/batch  Multipart form with several image files, or JSON {"images": [<base64>, ...]}
+    GET  /health         Liveness, model state and current queue depth
+    GET  /metrics        Prometheus-style counters and the queue-depth gauge
+
+Usage:
+    python inference_server.py [--host 0.0.0.0] [--port 8080] [--stand-in]
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from PIL import Image
+
+from model_manager import get_manager
+from textile_core import DEFAULT_BATCH_SIZE, load_rgb_array, predict_batch
+
+# Longest time the first request of a batch waits for others to join it
+DEFAULT_MAX_WAIT_MS = 5.0
+
+
+class MicroBatcher:
+    """Collects single-image requests into batches and runs one inference per batch."""
+
+    def __init__(self, predict=predict_batch, max_batch_size=DEFAULT_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        """
+        Args:
+            predict (callable): Maps a list of model-sized RGB arrays to (labels, confidences).
+            max_batch_size (int): Maximum images per inference call.
+            max_wait_ms (float): Maximum time a request waits for its batch to fill.
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = asyncio.Queue()
+        # A single inference thread keeps model calls serialized and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self._task = None
+        self.in_flight = 0
+        self.batches = 0
+        self.images = 0
+
+    @property
+    def queue_depth(self):
+        """Images waiting for or undergoing inference."""
+        return self._queue.qsize() + self.in_flight
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, image):
+        """Queue one model-sized RGB array and wait for its (label, confidence)."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def _collect(self):
+        """Wait for one request, then gather more until the batch is full or the wait expires."""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            images = [image for image, _ in batch]
+            self.in_flight = len(batch)
+            try:
+                labels, confidences = await loop.run_in_executor(
+                    self._executor, self.predict, images, self.max_batch_size
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), label, confidence in zip(batch, labels, confidences):
+                    if not future.done():
+                        future.set_result((str(label), float(confidence)))
+            finally:
+                self.in_flight = 0
+            self.batches += 1
+            self.images += len(batch)
+
+
+def _bad_request(message):
+    """400 response with a JSON error body, for requests the client has to fix."""
+    return web.HTTPBadRequest(text=json.dumps({'error': message}), content_type='application/json')
+
+
+def _decode(data):
+    """Decode image bytes into a model-sized RGB array."""
+    return load_rgb_array(Image.open(io.BytesIO(data)))
+
+
+async def _read_images(request):
+    """Return the raw image payloads of a request (multipart files, JSON base64 list or raw body)."""
+    if request.content_type.startswith('multipart/'):
+        payloads = []
+        reader = await request.multipart()
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            payloads.append(await part.read())
+        return payloads
+    if request.content_type == 'application/json':
+        try:
+            body = await request.json()
+            images = body['images']
+            if not isinstance(images, list):
+                raise ValueError("'images' must be a list of base64 strings")
+            return [base64.b64decode(image, validate=True) for image in images]
+        except json.JSONDecodeError as e:
+            raise _bad_request(f"Malformed JSON: {e}")
+        except binascii.Error as e:
+            raise _bad_request(f"Malformed base64 image: {e}")
+        except (KeyError, TypeError, ValueError) as e:
+            raise _bad_request(f"Expected a JSON object {{\"images\": [<base64>, ...]}}: {e}")
+    return [await request.read()]
+
+
+async def _classify(request, payloads):
+    loop = asyncio.get_running_loop()
+    try:
+        # Decoding runs on the default thread pool so it overlaps with inference
+        images = await asyncio.gather(*(loop.run_in_executor(None, _decode, data) for data in payloads))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # Unreadable or oversized image data; anything else is a server error and stays a 500
+        raise _bad_request(f"Could not decode image: {e}")
+    batcher = request.app['batcher']
+    results = await asyncio.gather(*(batcher.submit(image) for image in images))
+    return [{'label': label, 'confidence': confidence} for label, confidence in results]
+
+
+async def predict(request):
+    payloads = await _read_images(request)
+    if len(payloads) != 1:
+        raise _bad_request("Expected exactly one image; use /predict/batch for several")
+    return web.json_response((await _classify(request, payloads))[0])
+
+
+async def predict_many(request):
+    payloads = await _read_images(request)
+    if not payloads:
+        raise _bad_request("No images in request")
+    return web.json_response({'results': await _classify(request, payloads)})
+
+
+async def health(request):
+    batcher = request.app['batcher']
+    return web.json_response({
+        'status': 'ok',
+        'model_loaded': get_manager().is_loaded,
+        'model_version': get_manager().version,
+        'queue_depth': batcher.queue_depth,
+    })
+
+
+async def metrics(request):
+    batcher = request.app['batcher']
+    lines = [
+        '# TYPE textile_queue_depth gauge',
+        f'textile_queue_depth {batcher.queue_depth}',
+        '# TYPE textile_batches_total counter',
+        f'textile_batches_total {batcher.batches}',
+        '# TYPE textile_images_total counter',
+        f'textile_images_total {batcher.images}',
+    ]
+    return web.Response(text='\n'.join(lines) + '\n', content_type='text/plain')
+
+
+def create_app(max_batch_size=DEFAULT_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """Build the aiohttp application with its micro-batcher."""
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app['batcher'] = MicroBatcher(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    async def on_startup(app):
+        app['batcher'].start()
+        # Load and trace the model before the first request arrives
+        await asyncio.get_running_loop().run_in_executor(None, get_manager().warm_up)
+
+    async def on_cleanup(app):
+        await app['batcher'].stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post('/predict', predict)
+    app.router.add_post('/predict/batch', predict_many)
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--stand-in', action='store_true', help='Serve a tiny untrained stand-in model')
+    args = parser.parse_args()
+
+    if args.stand_in:
+        from stand_in_model import use_stand_in_model
+        use_stand_in_model()
+    web.run_app(create_app(args.max_batch_size, args.max_wait_ms), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Hot-path instrumentation: per-stage duration histograms, counters and on-demand profiling.
+
+Disabled by default. When disabled, `stage()` returns a shared no-op context manager and
+`count()` returns immediately, so instrumented code pays one global lookup per call.
+
+Enable with `"metrics_enabled": true` in textile_config.json or TEXTILE_METRICS=1, then either
+  * set `metrics_port` to serve Prometheus text on http://127.0.0.1:PORT/metrics (`metrics_host`
+    binds another interface; with `metrics_profile_enabled`, GET /profile?seconds=N also arms a
+    cProfile capture of the next N seconds of predictions), or
+  * set `metrics_log_interval` to log a summary every N seconds.
+"""
+import contextlib
+import cProfile
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from settings import load_settings
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf'))
+
+_settings = load_settings()
+ENABLED = str(os.environ.get('TEXTILE_METRICS', _settings.get('metrics_enabled', False))).lower() in ('1', 'true', 'yes')
+
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'observations')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.observations = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.observations += 1
+
+
+class _StageTimer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enable(enabled=True):
+    """Turn instrumentation on or off at runtime."""
+    global ENABLED
+    ENABLED = enabled
+
+
+def stage(name):
+    """
+    Time a block of code as one observation of the named stage.
+
+    Usage:
+        with instrumentation.stage('decode'):
+            ...
+    """
+    if not ENABLED:
+        return _NOOP
+    return _StageTimer(name)
+
+
+def observe(name, seconds):
+    """Record a duration for the named stage."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        histogram.observe(seconds)
+
+
+def count(name, amount=1):
+    """Increase the named counter, e.g. 'images' or 'frames_skipped'."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def reset():
+    """Forget every recorded observation and counter."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def snapshot():
+    """
+    Return the current measurements.
+
+    Returns:
+        dict: `stages` maps a stage to its count, total and mean seconds; `counters` maps a counter to its value.
+    """
+    with _lock:
+        return {
+            'stages': {
+                name: {
+                    'count': h.observations,
+                    'total_seconds': h.total,
+                    'mean_seconds': h.total / h.observations if h.observations else 0.0,
+                }
+                for name, h in _histograms.items()
+            },
+            'counters': dict(_counters),
+        }
+
+
+def render_prometheus():
+    """Render every histogram and counter in the Prometheus text exposition format."""
+    lines = ['# TYPE textile_stage_seconds histogram']
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, h.counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'textile_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'textile_stage_seconds_sum{{stage="{name}"}} {h.total}')
+            lines.append(f'textile_stage_seconds_count{{stage="{name}"}} {h.observations}')
+        for name, value in sorted(_counters.items()):
+            lines.append(f'# TYPE textile_{name}_total counter')
+            lines.append(f'textile_{name}_total {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# On-demand profiling: armed through request_profile, captured inside profiled() blocks
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def request_profile(seconds=10.0, path='textile_profile.pstats'):
+    """
+    Profile the next `seconds` of hot-path calls and write the stats to `path`.
+
+    Only calls wrapped in `profiled()` are captured, one thread at a time.
+    """
+    global _profile
+    with _profile_lock:
+        _profile = {'deadline': time.monotonic() + seconds, 'path': path, 'profiler': cProfile.Profile()}
+
+
+@contextlib.contextmanager
+def _capture(profile):
+    profiler = profile['profiler']
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+
+
+def profiled():
+    """Context manager around a hot-path entry point; a no-op unless a profile capture is armed."""
+    global _profile
+    profile = _profile
+    if profile is None or not _profile_lock.acquire(blocking=False):
+        return _NOOP
+    if time.monotonic() > profile['deadline']:
+        profile['profiler'].dump_stats(profile['path'])
+        logger.info("Profile written to %s", profile['path'])
+        _profile = None
+        _profile_lock.release()
+        return _NOOP
+    return _capture(profile)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        elif url.path == '/profile' and self.server.profile_enabled:
+            seconds = float(parse_qs(url.query).get('seconds', ['10'])[0])
+            request_profile(seconds)
+            body = f"Profiling the next {seconds:g}s of predictions\n".encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+        else:
+            body = b'Not found\n'
+            self.send_response(404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1', profile=False):
+    """
+    Serve /metrics from a daemon thread and return the server.
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Interface to bind; only this host by default.
+        profile (bool): Also serve /profile, which lets any client that reaches the port slow
+            the process down with a cProfile capture.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.profile_enabled = profile
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_log_dump(interval):
+    """Log a one-line summary of every stage and counter every `interval` seconds."""
+    def run():
+        while True:
+            time.sleep(interval)
+            data = snapshot()
+            stages = ', '.join(
+                f"{name}={s['mean_seconds'] * 1000:.2f}ms x{s['count']}" for name, s in sorted(data['stages'].items())
+            )
+            counters = ', '.join(f"{name}={value}" for name, value in sorted(data['counters'].items()))
+            logger.info("stages: %s | counters: %s", stages or '-', counters or '-')
+
+    thread = threading.Thread(target=run, name='metrics-log', daemon=True)
+    thread.start()
+    return thread
+
+
+_exporters_started = False
+
+
+def start_exporters():
+    """Start the exporters configured in the settings, once per process."""
+    global _exporters_started
+    if not ENABLED or _exporters_started:
+        return
+    _exporters_started = True
+    if _settings.get('metrics_port'):
+        try:
+            start_http_server(int(_settings['metrics_port']), _settings.get('metrics_host') or '127.0.0.1',
+                              bool(_settings.get('metrics_profile_enabled')))
+        except OSError as e:
+            # Several app processes on one host: the first one owns the port
+            logger.warning("Metrics endpoint not started: %s", e)
+    if _settings.get('metrics_log_interval'):
+        start_log_dump(float(_settings['metrics_log_interval']))
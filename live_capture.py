@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class LatestFrameCapture:
+    """
+    Reads a camera on a dedicated thread and keeps only the newest frame.
+
+    When inference is slower than the camera, reading on the inference thread lets frames
+    queue up in the driver buffer and the displayed label drifts behind the fabric. Here the
+    capture thread drains the camera continuously; consumers always get the most recent
+    frame and older unconsumed frames are counted as dropped.
+    """
+
+    def __init__(self, source=0, paced=False, notify=None):
+        """
+        Args:
+            source (int | str): Camera index, video file or stream URL passed to cv2.VideoCapture.
+            paced (bool): Deliver frames no faster than the source's frame rate, so a local video
+                file behaves like a live camera instead of being decoded as fast as possible.
+            notify (threading.Event, optional): Set whenever a new frame is available, so one
+                consumer can wait on several captures at once.
+        """
+        self.source = source
+        self.paced = paced
+        self.notify = notify
+        self._cap = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._condition = threading.Condition()
+        self._frame = None
+        self._captured_at = 0.0
+        self._sequence = 0
+        self._consumed = 0
+        self.captured = 0
+        self.dropped = 0
+        self.failed = False
+
+    def start(self):
+        """
+        Open the source and start the capture thread.
+
+        Returns:
+            bool: False if the source could not be opened.
+        """
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='frame-capture', daemon=True)
+        self._thread.start()
+        return True
+
+    @property
+    def frame_size(self):
+        """(width, height) of the captured frames."""
+        return int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    @property
+    def active(self):
+        """True while the source is open and still delivering frames."""
+        return self._cap is not None and not self.failed
+
+    def _run(self):
+        fps = self._cap.get(cv2.CAP_PROP_FPS) if self.paced else 0
+        interval = 1.0 / fps if fps and fps > 0 else 0.0
+        next_due = time.perf_counter()
+        while not self._stop.is_set():
+            if interval:
+                next_due += interval
+                delay = next_due - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+            ret, frame = self._cap.read()
+            captured_at = time.perf_counter()
+            with self._condition:
+                if not ret:
+                    self.failed = True
+                    self._condition.notify_all()
+                    if self.notify is not None:
+                        self.notify.set()
+                    return
+                if self._sequence > self._consumed:
+                    # The previous frame was never picked up by a consumer
+                    self.dropped += 1
+                self._frame = frame
+                self._captured_at = captured_at
+                self._sequence += 1
+                self.captured += 1
+                self._condition.notify_all()
+            if self.notify is not None:
+                self.notify.set()
+
+    def read(self, timeout=1.0):
+        """
+        Wait for a frame newer than the last one returned.
+
+        Args:
+            timeout (float): Seconds to wait for a new frame.
+
+        Returns:
+            tuple: (ok, frame, captured_at) where captured_at is a time.perf_counter() timestamp.
+                ok is False when the feed ended, failed or timed out.
+        """
+        with self._condition:
+            available = self._condition.wait_for(
+                lambda: self._sequence > self._consumed or self.failed or self._stop.is_set(), timeout
+            )
+            if not available or self._sequence <= self._consumed:
+                return False, None, None
+            self._consumed = self._sequence
+            return True, self._frame, self._captured_at
+
+    def stop(self):
+        """Stop the capture thread and release the camera."""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class LatencyTracker:
+    """Rolling capture-to-label latency over the most recent frames."""
+
+    def __init__(self, window=100):
+        self._samples = deque(maxlen=window)
+
+    def record(self, captured_at):
+        """Record the latency of a frame whose label has just been shown."""
+        self._samples.append(time.perf_counter() - captured_at)
+
+    @property
+    def mean_ms(self):
+        return 1000 * sum(self._samples) / len(self._samples) if self._samples else 0.0
+
+    @property
+    def max_ms(self):
+        return 1000 * max(self._samples) if self._samples else 0.0
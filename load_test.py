@@ -0,0 +1,114 @@
+"""
+Load test for inference_server.py.
+
+Starts the server with the stand-in model on a local port (unless --url is given), fires
+--requests single-image requests with --concurrency in flight, and reports throughput,
+latency percentiles and the average micro-batch size the server formed.
+
+Usage:
+    python load_test.py [--requests 2000] [--concurrency 64] [--max-batch-size 32] [--max-wait-ms 5]
+"""
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+from PIL import Image
+
+
+def _synthetic_images(count, size=(256, 256), seed=0):
+    """Encode a few random PNG images to cycle through."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (*size, 3), dtype=np.uint8)).save(buffer, format='PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+async def _wait_until_healthy(session, url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{url}/health") as response:
+                if response.status == 200 and (await response.json())['model_loaded']:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not become healthy within {timeout}s")
+
+
+async def _metric(session, url, name):
+    async with session.get(f"{url}/metrics") as response:
+        for line in (await response.text()).splitlines():
+            if line.startswith(name + ' '):
+                return float(line.split()[1])
+    return 0.0
+
+
+async def run_load(url, requests, concurrency):
+    images = _synthetic_images(16)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        await _wait_until_healthy(session, url)
+        batches_before = await _metric(session, url, 'textile_batches_total')
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(f"{url}/predict", data=images[i % len(images)]) as response:
+                    response.raise_for_status()
+                    await response.json()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        batches = await _metric(session, url, 'textile_batches_total') - batches_before
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"Requests:           {requests} ({concurrency} concurrent)")
+    print(f"Throughput:         {requests / elapsed:.1f} images/s")
+    print(f"Latency p50/p95/p99: {np.percentile(latencies_ms, 50):.1f} / "
+          f"{np.percentile(latencies_ms, 95):.1f} / {np.percentile(latencies_ms, 99):.1f} ms")
+    print(f"Average batch size: {requests / batches:.1f}" if batches else "Average batch size: n/a")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Test an already running server instead of starting one')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen([
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_server.py'),
+            '--host', '127.0.0.1', '--port', str(args.port), '--stand-in',
+            '--max-batch-size', str(args.max_batch_size), '--max-wait-ms', str(args.max_wait_ms),
+        ])
+    try:
+        asyncio.run(run_load(url, args.requests, args.concurrency))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,13 @@
 import streamlit as st
-from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import img_to_array, load_img
 from tensorflow.keras.applications.vgg16 import preprocess_input
 import numpy as np
 from PIL import Image
 import os
+from model_manager import get_manager, get_model
 
-# Load the pre-trained model
-model = load_model('TILDA_model_efficientNet-B0.h5')
+# Load the pre-trained model once per process (this script re-runs on every interaction)
+get_manager().start_warm_up()
 
 # Class labels for your textile classification
 class_labels = ['good', 'hole', 'objects', 'oil spot', 'thread error']  # Adjust based on your model's output
@@ -22,7 +22,7 @@ def predict_image(file_path):
         img_array = preprocess_input(img_array)  # Preprocess input using VGG16's method
 
         # Make a prediction
-        predictions = model.predict(img_array)
+        predictions = get_model().predict(img_array)
       #  st.write(f"Raw predictions: {predictions}")  # Debugging: Check raw predictions
         predicted_class = np.argmax(predictions, axis=1)
 
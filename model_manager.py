@@ -0,0 +1,318 @@
+import contextlib
+import logging
+import threading
+import time
+
+from backends import Backend, KerasBackend, configure_threads, load_backend, pin_cpus
+from settings import load_settings
+
+logger = logging.getLogger(__name__)
+
+_settings = load_settings()
+
+# Inference backend and model artifact, from textile_config.json or TEXTILE_BACKEND / TEXTILE_MODEL_PATH
+BACKEND = _settings['backend']
+MODEL_PATH = _settings['model_path']
+NUM_THREADS = _settings['num_threads']
+
+# Inference worker processes (see worker_pool.py)
+WORKERS = int(_settings['workers'] or 0)
+
+# CPU profile, usually written by `python autotune.py`: TensorFlow thread pools and the CPUs inference may use
+INTRA_OP_THREADS = _settings['intra_op_threads']
+INTER_OP_THREADS = _settings['inter_op_threads']
+CPU_AFFINITY = _settings['cpu_affinity']
+
+# Versioned model registry the process follows (see model_registry.py), and how often it checks it
+REGISTRY_DIR = _settings['registry_dir']
+REGISTRY_POLL_SECONDS = _settings['registry_poll_seconds']
+
+
+class ModelManager:
+    """
+    Loads the model lazily, at most once per process, and shares it between callers.
+
+    Streamlit re-executes the page script on every interaction but keeps imported modules,
+    so a manager held by a module is shared by all sessions served by the same process.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, backend=BACKEND, num_threads=NUM_THREADS, loader=None,
+                 workers=WORKERS):
+        """
+        Args:
+            model_path (str): Path to the model artifact.
+            backend (str): Inference backend, 'keras', 'tflite' or 'onnx'.
+            num_threads (int, optional): CPU threads for the TFLite and ONNX Runtime backends.
+            loader (callable, optional): Function loading a Backend from a path; defaults to load_backend.
+            workers (int): With more than one, the model runs in a WorkerPool of that many processes.
+        """
+        self.model_path = model_path
+        self.backend = backend
+        self.num_threads = num_threads
+        self.workers = workers
+        self.version = None
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._retired = set()
+        self._warm_up_thread = None
+        self._watch_thread = None
+        self._rejected = None
+        self.warm_up_error = None
+        self.swap_error = None
+        self.timings = {}
+
+    @property
+    def is_loaded(self):
+        """True once the model has been loaded into memory."""
+        return self._model is not None
+
+    def get(self):
+        """
+        Return the model, loading it on first use. Concurrent first calls wait for a single load.
+
+        Returns:
+            Backend: The loaded model behind the configured inference backend.
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = self._load(self.model_path, self.backend)
+                    self.timings['load_seconds'] = time.perf_counter() - start
+        return self._model
+
+    def _load(self, model_path, backend):
+        if self._loader is not None:
+            return self._loader(model_path)
+        if self.workers > 1:
+            from worker_pool import WorkerPool
+
+            return WorkerPool(
+                self.workers, model_path, backend, INTRA_OP_THREADS or self.num_threads, INTER_OP_THREADS or 1,
+            )
+        apply_cpu_profile()
+        return load_backend(backend, model_path, self.num_threads or INTRA_OP_THREADS)
+
+    @contextlib.contextmanager
+    def lease(self):
+        """
+        Use the current model for one inference. A model swapped out meanwhile stays usable
+        until every lease on it has ended, and only then is it closed.
+
+        Usage:
+            with manager.lease() as model:
+                probabilities = model.predict(batch)
+        """
+        self.get()
+        # Read the model and count the lease together, so a concurrent swap() cannot close it in between
+        with self._lock:
+            model = self._model
+            self._leases[model] = self._leases.get(model, 0) + 1
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._leases[model] -= 1
+                release = self._leases[model] == 0
+                if release:
+                    del self._leases[model]
+                    release = model in self._retired
+                    self._retired.discard(model)
+            if release:
+                _close(model)
+
+    def swap(self, model_path, backend=None, version=None, validate=None):
+        """
+        Load, warm up and validate another model, then atomically make it the served one.
+
+        The current model keeps serving while the new one is prepared; requests already running
+        on it finish on it. If loading or validation fails, nothing changes and the error is raised.
+
+        Args:
+            model_path (str): Path to the new model artifact.
+            backend (str, optional): Its backend; defaults to the current one.
+            version (str, optional): Version name reported by the manager.
+            validate (callable, optional): Called with the new model and raising if it must not be
+                served; defaults to model_registry.validate_model.
+        """
+        backend = backend or self.backend
+        if self._model is None:
+            # Nothing loaded yet: the first get() loads the new model directly
+            with self._lock:
+                self.model_path, self.backend, self.version = model_path, backend, version
+            return
+        if validate is None:
+            from model_registry import validate_model as validate
+
+        start = time.perf_counter()
+        model = self._load(model_path, backend)
+        try:
+            model.warm_up()
+            validate(model)
+        except Exception:
+            _close(model)
+            raise
+        with self._lock:
+            previous = self._model
+            self._model = model
+            self.model_path, self.backend, self.version = model_path, backend, version
+            retire_later = previous in self._leases
+            if retire_later:
+                self._retired.add(previous)
+        if not retire_later:
+            _close(previous)
+        self.timings['swap_seconds'] = time.perf_counter() - start
+        logger.info("Now serving model %s (%s)", version or model_path, backend)
+
+    def set_model(self, model):
+        """Replace the managed model, e.g. with a small stand-in Keras model for tests and benchmarks."""
+        if not isinstance(model, Backend):
+            model = KerasBackend(model)
+        with self._lock:
+            self._model = model
+
+    def warm_up(self, run=None):
+        """
+        Load the model and run one inference so graph tracing is paid before the first user request.
+
+        Args:
+            run (callable, optional): Called with the model to perform the warm-up inference;
+                defaults to the backend's own warm-up.
+        """
+        with self.lease() as model:
+            start = time.perf_counter()
+            if run is None:
+                model.warm_up()
+            else:
+                run(model)
+        self.timings['warm_up_seconds'] = time.perf_counter() - start
+
+    def start_warm_up(self, run=None):
+        """
+        Warm the model up in a background thread. Only the first call per manager starts a thread.
+
+        Returns:
+            threading.Thread: The warm-up thread.
+        """
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(
+                    target=self._background_warm_up, args=(run,), name='model-warm-up', daemon=True
+                )
+                self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def _background_warm_up(self, run):
+        try:
+            self.warm_up(run)
+        except Exception as e:
+            # Surface the failure on the first real prediction instead of killing the app
+            self.warm_up_error = e
+
+    def follow_registry(self, registry, interval=REGISTRY_POLL_SECONDS):
+        """
+        Serve the registry's active version and swap to a newly activated one in the background.
+
+        A version that fails to load or validate is not retried until the active version changes again;
+        the running model keeps serving and the error is kept in `swap_error`.
+
+        Args:
+            registry (ModelRegistry): The registry to follow.
+            interval (float): Seconds between checks of the registry manifest.
+
+        Returns:
+            threading.Thread: The watcher thread.
+        """
+        self._sync_with_registry(registry)
+        with self._lock:
+            if self._watch_thread is None:
+                self._watch_thread = threading.Thread(
+                    target=self._watch_registry, args=(registry, interval), name='model-registry', daemon=True
+                )
+                self._watch_thread.start()
+        return self._watch_thread
+
+    def _sync_with_registry(self, registry):
+        entry = registry.active()
+        if entry is None or entry['path'] == self.model_path:
+            return
+        key = (entry['version'], entry['path'])
+        if key == self._rejected:
+            return
+        try:
+            self.swap(entry['path'], entry['backend'], entry['version'])
+            self.swap_error = None
+        except Exception as e:
+            self._rejected = key
+            self.swap_error = e
+            logger.warning("Model %s was not swapped in: %s", entry['version'], e)
+
+    def _watch_registry(self, registry, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self._sync_with_registry(registry)
+            except Exception as e:
+                # An unreadable manifest must not stop the watcher
+                logger.warning("Could not read model registry %s: %s", registry.root, e)
+
+
+_cpu_profile_applied = False
+
+
+def apply_cpu_profile(cpu_affinity=CPU_AFFINITY, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+    """
+    Apply thread pools and CPU affinity to this process, once, before the first model load.
+
+    The model load applies the configured profile. A process that splits the host with its
+    siblings (e.g. the segment workers of segmented_video.py) calls this first with its own
+    share, and the configured profile is then skipped.
+
+    Args:
+        cpu_affinity (sequence, optional): CPU ids the process may use.
+        intra_op_threads (int, optional): TensorFlow threads inside one op.
+        inter_op_threads (int, optional): TensorFlow ops run concurrently.
+    """
+    global _cpu_profile_applied
+    if _cpu_profile_applied:
+        return
+    _cpu_profile_applied = True
+    pin_cpus(cpu_affinity)
+    try:
+        configure_threads(intra_op_threads, inter_op_threads)
+    except RuntimeError as e:
+        # TensorFlow refuses once its runtime is initialized, e.g. after a model was already used
+        logger.warning("TensorFlow thread settings not applied: %s", e)
+
+
+def _close(model):
+    """Release a model's resources, e.g. the processes of a WorkerPool."""
+    close = getattr(model, 'close', None)
+    if close is not None:
+        close()
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def get_manager():
+    """Return the process-wide model manager."""
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                manager = ModelManager()
+                if REGISTRY_DIR:
+                    from model_registry import ModelRegistry
+
+                    manager.follow_registry(ModelRegistry(REGISTRY_DIR))
+                _default_manager = manager
+    return _default_manager
+
+
+def get_model():
+    """Return the process-wide model, loading it on first use."""
+    return get_manager().get()
@@ -0,0 +1,224 @@
+"""
+Versioned model files and the pointer to the version running apps should serve.
+
+The registry is a directory holding one subdirectory per version and a `registry.json`
+manifest with the active version and the activation history. Running apps configured with
+`"registry_dir"` poll the manifest; when the active version changes they load and warm the new
+model in the background, validate it, and only then swap it in (see ModelManager.swap).
+
+Usage:
+    python model_registry.py add MODEL_FILE [--version V] [--backend keras] [--activate]
+    python model_registry.py activate V
+    python model_registry.py rollback
+    python model_registry.py list
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from settings import load_settings
+
+MANIFEST = 'registry.json'
+
+# Synthetic images checked when no labelled validation folder is configured
+SYNTHETIC_VALIDATION_SIZE = 8
+
+# Allowed deviation of a probability row's sum from one. int8 models emit softmax outputs in
+# steps of 1/256, so each class may be off by up to one step after dequantization.
+PROBABILITY_SUM_TOLERANCE = 1e-2
+
+_validation_set = None
+_validation_lock = threading.Lock()
+
+
+def _load_validation_set(directory):
+    """Preprocessed images and class indices of the validation folder, loaded once per process."""
+    global _validation_set
+    with _validation_lock:
+        if _validation_set is None or _validation_set[0] != directory:
+            from bulk_classify import load_labelled_folder
+            from textile_core import class_labels, preprocess_batch
+
+            images, labels = load_labelled_folder(directory)
+            known = np.isin(labels, class_labels)
+            indices = np.array([class_labels.index(label) for label in labels[known]], dtype=np.int64)
+            _validation_set = (directory, preprocess_batch(list(images[known])), indices)
+        return _validation_set[1], _validation_set[2]
+
+
+def validate_model(model, validation_dir=None, min_accuracy=None):
+    """
+    Check that a freshly loaded model may be served; raise ValueError if not.
+
+    Every model must return one probability row per input, with finite values that sum to one
+    (within the rounding of int8-quantized models).
+    With a validation folder it must also reach `min_accuracy` on it.
+
+    Args:
+        model (Backend): The candidate model.
+        validation_dir (str, optional): Labelled folder; defaults to `validation_dir` in the settings.
+        min_accuracy (float, optional): Defaults to `validation_min_accuracy` in the settings.
+    """
+    from textile_core import IMG_SIZE, class_labels, preprocess_batch
+
+    settings = load_settings()
+    validation_dir = validation_dir or settings['validation_dir']
+    min_accuracy = settings['validation_min_accuracy'] if min_accuracy is None else min_accuracy
+    if validation_dir:
+        batch, expected = _load_validation_set(validation_dir)
+    else:
+        rng = np.random.default_rng(0)
+        images = rng.integers(0, 256, (SYNTHETIC_VALIDATION_SIZE, *IMG_SIZE, 3), dtype=np.uint8)
+        batch, expected = preprocess_batch(list(images)), None
+
+    probabilities = np.asarray(model.predict(batch))
+    if probabilities.shape != (len(batch), len(class_labels)):
+        raise ValueError(f"Expected outputs of shape {(len(batch), len(class_labels))}, got {probabilities.shape}")
+    if not np.all(np.isfinite(probabilities)):
+        raise ValueError("Model returned non-finite outputs")
+    tolerance = max(PROBABILITY_SUM_TOLERANCE, len(class_labels) / 256)
+    if not np.allclose(probabilities.sum(axis=1), 1.0, rtol=0, atol=tolerance):
+        raise ValueError("Model outputs are not class probabilities")
+    if expected is not None and len(expected):
+        accuracy = float(np.mean(np.argmax(probabilities, axis=1) == expected))
+        if accuracy < min_accuracy:
+            raise ValueError(f"Validation accuracy {accuracy:.2%} is below {min_accuracy:.2%}")
+
+
+class ModelRegistry:
+    """Reads and updates the manifest of a model registry directory."""
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): Registry directory; created on the first `add`.
+        """
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST)
+
+    def _read(self):
+        if not os.path.exists(self.manifest_path):
+            return {'versions': {}, 'active': None, 'history': []}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        # Write-then-rename, so a polling app never reads a half-written manifest
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
+
+    def versions(self):
+        """All registered versions, oldest first, as dicts with `version`, `path`, `backend` and `added`."""
+        entries = self._read()['versions'].values()
+        return sorted(entries, key=lambda entry: entry['added'])
+
+    def get(self, version):
+        entry = self._read()['versions'].get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version {version!r}")
+        return entry
+
+    def active(self):
+        """The active version's entry, or None when nothing has been activated."""
+        manifest = self._read()
+        if manifest['active'] is None:
+            return None
+        return manifest['versions'][manifest['active']]
+
+    def add(self, model_file, version=None, backend='keras'):
+        """
+        Copy a model file into the registry as a new version.
+
+        Args:
+            model_file (str): Model artifact (.h5, .keras, .tflite or .onnx).
+            version (str, optional): Version name; defaults to a timestamp.
+            backend (str): Backend serving the file, 'keras', 'tflite' or 'onnx'.
+
+        Returns:
+            dict: The new entry.
+        """
+        manifest = self._read()
+        version = version or time.strftime('%Y%m%d-%H%M%S')
+        if version in manifest['versions']:
+            raise ValueError(f"Model version {version!r} already exists")
+        directory = os.path.join(self.root, version)
+        os.makedirs(directory)
+        path = os.path.join(directory, os.path.basename(model_file))
+        shutil.copy2(model_file, path)
+        entry = {'version': version, 'path': path, 'backend': backend, 'added': time.time()}
+        manifest['versions'][version] = entry
+        self._write(manifest)
+        return entry
+
+    def activate(self, version):
+        """Make `version` the one running apps should serve."""
+        manifest = self._read()
+        if version not in manifest['versions']:
+            raise KeyError(f"Unknown model version {version!r}")
+        if manifest['active'] != version:
+            manifest['active'] = version
+            manifest['history'].append(version)
+            self._write(manifest)
+        return manifest['versions'][version]
+
+    def rollback(self):
+        """
+        Reactivate the version that was active before the current one.
+
+        Returns:
+            dict: The reactivated entry.
+        """
+        manifest = self._read()
+        if len(manifest['history']) < 2:
+            raise ValueError("No earlier version to roll back to")
+        manifest['history'].pop()
+        manifest['active'] = manifest['history'][-1]
+        self._write(manifest)
+        return manifest['versions'][manifest['active']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registry', default=load_settings()['registry_dir'] or 'models',
+                        help='Registry directory (default: registry_dir from the settings, else models)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='Register a model file as a new version')
+    add.add_argument('model_file')
+    add.add_argument('--version', help='Version name (default: a timestamp)')
+    add.add_argument('--backend', default='keras', choices=('keras', 'tflite', 'onnx'))
+    add.add_argument('--activate', action='store_true', help='Also make it the active version')
+    activate = commands.add_parser('activate', help='Serve a registered version')
+    activate.add_argument('version')
+    commands.add_parser('rollback', help='Serve the previously active version again')
+    commands.add_parser('list', help='List the registered versions')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'add':
+        entry = registry.add(args.model_file, args.version, args.backend)
+        print(f"Registered {entry['version']} at {entry['path']}")
+        if args.activate:
+            registry.activate(entry['version'])
+            print(f"Activated {entry['version']}")
+    elif args.command == 'activate':
+        print(f"Activated {registry.activate(args.version)['version']}")
+    elif args.command == 'rollback':
+        print(f"Rolled back to {registry.rollback()['version']}")
+    else:
+        active = registry.active()
+        for entry in registry.versions():
+            marker = '*' if active and entry['version'] == active['version'] else ' '
+            added = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['added']))
+            print(f"{marker} {entry['version']:<20}{entry['backend']:<8}{added}  {entry['path']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Classify several camera streams with shared, fairly scheduled inference calls.
+
+Each source (camera index, video file or RTSP URL) is read by its own LatestFrameCapture, so
+a stream never builds a backlog. One scheduler thread batches the newest frame of every stream
+into a single model call. A batch takes at most one frame per stream and the stream that goes
+first rotates between batches, so a busy stream can neither fill a batch on its own nor keep a
+quiet one waiting for more than one round.
+
+Usage (local video files stand in for cameras and are paced at their own frame rate):
+    python multi_stream.py loom1.mp4 loom2.mp4 rtsp://camera3/stream 0 [--seconds 30] [--stand-in]
+"""
+import argparse
+import threading
+import time
+from collections import deque
+
+from instrumentation import stage
+from live_capture import LatestFrameCapture
+from textile_core import DEFAULT_BATCH_SIZE, predict_frames
+
+# Longest time the first frame of a batch waits for the other streams to deliver theirs
+DEFAULT_MAX_WAIT_MS = 10.0
+
+# Pause of the scheduler thread after collecting nothing, in seconds
+IDLE_WAIT = 0.05
+
+
+def parse_source(source):
+    """Camera indices are given as digits; anything else is a file path or stream URL."""
+    return int(source) if str(source).isdigit() else source
+
+
+class StreamStats:
+    """Rolling frame rate and capture-to-result latency of one stream."""
+
+    def __init__(self, window=100):
+        self._results = deque(maxlen=window)
+        self.classified = 0
+        self.label = None
+        self.confidence = None
+
+    def record(self, captured_at, label, confidence):
+        self._results.append((time.perf_counter(), time.perf_counter() - captured_at))
+        self.classified += 1
+        self.label = label
+        self.confidence = confidence
+
+    def snapshot(self):
+        results = list(self._results)
+        latencies = sorted(latency for _, latency in results)
+        span = results[-1][0] - results[0][0] if len(results) > 1 else 0.0
+        return {
+            'classified': self.classified,
+            'fps': (len(results) - 1) / span if span > 0 else 0.0,
+            'latency_mean_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p95_ms': 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            'label': self.label,
+            'confidence': self.confidence,
+        }
+
+
+class MultiStreamScheduler:
+    """Reads N sources concurrently and classifies their newest frames in shared batches."""
+
+    def __init__(self, sources, batch_size=DEFAULT_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 classify=predict_frames, on_result=None, paced_files=True):
+        """
+        Args:
+            sources (list): Camera indices, video files or stream URLs.
+            batch_size (int): Maximum frames per model call; with more streams than this,
+                the streams take turns.
+            max_wait_ms (float): Longest time a frame waits for others to join its batch.
+            classify (callable): Maps a list of BGR frames to (labels, confidences).
+            on_result (callable, optional): Called from the scheduler thread as
+                on_result(stream, frame, label, confidence) after each classification.
+            paced_files (bool): Play local video files at their own frame rate, like cameras.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        self.sources = [parse_source(source) for source in sources]
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.classify = classify
+        self.on_result = on_result
+        self._ready = threading.Event()
+        self.captures = [
+            LatestFrameCapture(source, paced=paced_files and isinstance(source, str) and '://' not in source,
+                               notify=self._ready)
+            for source in self.sources
+        ]
+        self.stats = [StreamStats() for _ in self.sources]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.batches = 0
+        self.error = None
+
+    def start(self):
+        """
+        Open every source and start the scheduler.
+
+        Returns:
+            list: Sources that could not be opened (they are left out).
+        """
+        failed = [capture.source for capture in self.captures if not capture.start()]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='multi-stream', daemon=True)
+        self._thread.start()
+        return failed
+
+    def stop(self):
+        self._stop.set()
+        self._ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        for capture in self.captures:
+            capture.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _live(self, stream):
+        return self.captures[stream].active
+
+    def _collect(self):
+        """Gather at most one new frame per stream, in rotating order, until the batch is full or the wait expires."""
+        streams = len(self.captures)
+        batch, taken = [], set()
+        deadline = None
+        while not self._stop.is_set():
+            self._ready.clear()
+            for offset in range(streams):
+                stream = (self._next + offset) % streams
+                if stream in taken or not self._live(stream):
+                    continue
+                ok, frame, captured_at = self.captures[stream].read(timeout=0)
+                if ok:
+                    batch.append((stream, frame, captured_at))
+                    taken.add(stream)
+                    if len(batch) == self.batch_size:
+                        break
+            live = sum(1 for stream in range(streams) if self._live(stream))
+            if not live:
+                # Every source has ended: hand over what was collected and stop the scheduler
+                self._stop.set()
+                break
+            if len(batch) >= min(self.batch_size, live):
+                break
+            now = time.perf_counter()
+            if batch and deadline is None:
+                deadline = now + self.max_wait
+            if deadline is not None and now >= deadline:
+                break
+            self._ready.wait(deadline - now if deadline is not None else 0.1)
+        if batch:
+            # The stream after the last one served goes first next time
+            self._next = (batch[-1][0] + 1) % streams
+        return batch
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                batch = self._collect()
+                if not batch:
+                    self._stop.wait(IDLE_WAIT)
+                    continue
+                frames = [frame for _, frame, _ in batch]
+                with stage('multi_stream_batch'):
+                    labels, confidences = self.classify(frames)
+                self.batches += 1
+                for (stream, frame, captured_at), label, confidence in zip(batch, labels, confidences):
+                    with self._lock:
+                        self.stats[stream].record(captured_at, str(label), float(confidence))
+                    if self.on_result is not None:
+                        self.on_result(stream, frame, str(label), float(confidence))
+        except Exception as e:
+            self.error = e
+
+    def snapshot(self):
+        """Per-stream statistics: classified frames, fps, mean/p95 latency, last label, capture drops."""
+        with self._lock:
+            rows = [stats.snapshot() for stats in self.stats]
+        for row, source, capture in zip(rows, self.sources, self.captures):
+            row['source'] = source
+            row['captured'] = capture.captured
+            row['dropped'] = capture.dropped
+            row['ended'] = capture.failed
+        return rows
+
+
+def _print_report(scheduler, elapsed):
+    print(f"{'source':<32}{'frames':>8}{'fps':>8}{'mean ms':>10}{'p95 ms':>9}{'dropped':>9}  label")
+    for row in scheduler.snapshot():
+        print(f"{str(row['source'])[-32:]:<32}{row['classified']:>8}{row['fps']:>8.1f}{row['latency_mean_ms']:>10.1f}"
+              f"{row['latency_p95_ms']:>9.1f}{row['dropped']:>9}  {row['label']}")
+    total = sum(row['classified'] for row in scheduler.snapshot())
+    if scheduler.batches:
+        print(f"{scheduler.batches} batches, {total / scheduler.batches:.1f} frames per batch, "
+              f"{total / elapsed:.1f} frames/s in total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources', nargs='+', help='Camera indices, video files or stream URLs')
+    parser.add_argument('--seconds', type=float, default=30.0, help='How long to run')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--report-every', type=float, default=5.0, help='Seconds between reports')
+    parser.add_argument('--stand-in', action='store_true', help='Use the tiny untrained stand-in model')
+    args = parser.parse_args()
+
+    from textile_core import warm_up
+
+    if args.stand_in:
+        from stand_in_model import use_stand_in_model
+        use_stand_in_model()
+    warm_up(background=False)
+
+    scheduler = MultiStreamScheduler(args.sources, args.batch_size, args.max_wait_ms)
+    for source in scheduler.start():
+        print(f"Could not open {source}")
+    start = time.perf_counter()
+    try:
+        while scheduler.running and time.perf_counter() - start < args.seconds:
+            time.sleep(min(args.report_every, args.seconds))
+            _print_report(scheduler, time.perf_counter() - start)
+    finally:
+        scheduler.stop()
+    if scheduler.error is not None:
+        raise scheduler.error
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from settings import load_settings
+
+
+def model_fingerprint(model_path):
+    """Identify a model (or other) file version by its path, size and modification time."""
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return 'missing'
+    return hashlib.sha256(f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def serving_scope():
+    """
+    Identify the rest of what answers predictions besides the model file: the inference backend
+    and the Good pre-filter, by its calibration and by the version of the file it was loaded from.
+    """
+    from cascade import get_cascade
+    from model_manager import get_manager
+
+    parts = [f"backend={get_manager().backend}"]
+    gate = get_cascade()
+    if gate is None:
+        parts.append('cascade=none')
+    else:
+        parts.append(f"cascade={gate.fingerprint()}")
+        if gate.path:
+            parts.append(f"cascade_file={model_fingerprint(gate.path)}")
+    return ':'.join(parts)
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of prediction results.
+
+    Entries are keyed by a SHA-256 of the image bytes (uploads) or of the preprocessed
+    tensor (video frames). The in-memory tier is an LRU bounded by entry count and by the
+    pickled size of the stored values. An optional on-disk tier keeps results across
+    restarts. Both tiers are scoped to a fingerprint of the model file, the backend and the
+    Good pre-filter, so replacing any of them invalidates every cached result automatically.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 ** 2, disk_dir=None, model_path=None, scope=serving_scope):
+        """
+        Args:
+            max_entries (int): Maximum number of results kept in memory.
+            max_bytes (int): Maximum total pickled size of the results kept in memory.
+            disk_dir (str, optional): Directory of the persistent tier; memory only when None.
+            model_path (str or callable, optional): Model file whose changes invalidate the cache,
+                or a function returning it. Defaults to the model manager's current model.
+            scope (callable, optional): Returns a string identifying everything else the results
+                depend on; defaults to serving_scope (backend and pre-filter).
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._model_path = model_path
+        self._scope = scope
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for_bytes(data):
+        """Cache key for encoded image bytes."""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def key_for_array(array):
+        """Cache key for a tensor; shape and dtype are part of the key."""
+        digest = hashlib.sha256(f"{array.shape}:{array.dtype}".encode())
+        digest.update(memoryview(array).cast('B') if array.flags.c_contiguous else array.tobytes())
+        return digest.hexdigest()
+
+    def _current_model_path(self):
+        if callable(self._model_path):
+            return self._model_path()
+        if self._model_path is not None:
+            return self._model_path
+        from model_manager import get_manager
+        return get_manager().model_path
+
+    def _check_model(self):
+        """Drop the memory tier when the model file, backend or pre-filter changed. Must be called with the lock held."""
+        fingerprint = model_fingerprint(self._current_model_path())
+        if self._scope is not None:
+            fingerprint = hashlib.sha256(f"{fingerprint}:{self._scope()}".encode()).hexdigest()[:16]
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._bytes = 0
+            self._fingerprint = fingerprint
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, self._fingerprint, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        """Return the cached value for a key, or None."""
+        with self._lock:
+            self._check_model()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            path = self._disk_path(key) if self.disk_dir else None
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._remember(key, value, len(pickle.dumps(value)))
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Store a value in memory and, if enabled, on disk."""
+        data = pickle.dumps(value)
+        with self._lock:
+            self._check_model()
+            self._remember(key, value, len(data))
+            path = self._disk_path(key) if self.disk_dir else None
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            # Atomic rename so concurrent readers never see a partial file
+            os.replace(temp_path, path)
+
+    def _remember(self, key, value, size):
+        """Insert into the memory tier and evict least recently used entries. Lock must be held."""
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for a key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Empty the memory tier and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """Hit and miss counters and the current size of the memory tier."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Return the process-wide prediction cache configured from the settings."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                settings = load_settings()
+                _default_cache = PredictionCache(
+                    max_entries=settings['cache_max_entries'],
+                    max_bytes=int(settings['cache_max_mb'] * 1024 ** 2),
+                    disk_dir=settings['cache_dir'],
+                )
+    return _default_cache
@@ -0,0 +1,312 @@
+"""
+Process a long offline video in parallel frame-range segments.
+
+One process decoding, classifying and encoding H.264 keeps only a few cores busy. Here the
+video is split into contiguous frame ranges; every range is handled by a VideoEngine in its
+own worker process, pinned to its own slice of the CPUs, which seeks to its first frame and
+writes its own part file. The parts are then concatenated into one output video (stream copy with ffmpeg when
+it is installed, re-encoding with OpenCV otherwise) and the per-frame labels into one timeline.
+
+Frames are classified independently of each other, so the labels match sequential processing
+frame for frame; adaptive frame skipping is therefore not offered here, as its state would
+restart at every segment boundary.
+
+Usage:
+    python segmented_video.py INPUT OUTPUT.mp4 [--workers N] [--verify] [--stand-in]
+    python segmented_video.py INPUT OUTPUT.mp4 --scaling [--stand-in]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from settings import apply_overrides, load_settings
+from video_stream import LabelTimeline
+
+# Read from the settings rather than textile_core: a spawned worker re-imports this module, and
+# textile_core must not load before the worker's settings overrides are in place
+DEFAULT_BATCH_SIZE = int(load_settings()['batch_size'])
+
+# Segments shorter than this cost more in model loading and seeking than they gain
+MIN_SEGMENT_FRAMES = 200
+
+
+def plan_segments(frame_count, workers, min_frames=MIN_SEGMENT_FRAMES):
+    """
+    Split a video into at most `workers` contiguous frame ranges of similar length.
+
+    CAP_PROP_FRAME_COUNT is only an estimate for many containers, so the last range is left
+    open and runs to the end of the file.
+
+    Args:
+        frame_count (int): Estimated number of frames.
+        workers (int): Largest number of ranges.
+        min_frames (int): Shortest range worth its own worker.
+
+    Returns:
+        list: (start, end) frame ranges; the last end is None.
+    """
+    segments = max(1, min(workers, max(0, frame_count) // max(1, min_frames)))
+    starts = [int(start) for start in np.linspace(0, max(0, frame_count), segments + 1)[:-1]]
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def cpu_slices(workers):
+    """
+    Split the CPUs this process may use into disjoint, equally sized slices, one per worker.
+
+    With more workers than CPUs, workers share single CPUs round-robin.
+    """
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    share = max(1, len(available) // workers)
+    return [
+        available[(i * share) % len(available):(i * share) % len(available) + share]
+        for i in range(workers)
+    ]
+
+
+def _worker_settings():
+    """
+    Settings overrides for the segment workers.
+
+    Each worker would otherwise start its own registry watcher and metrics exporters, i.e. N
+    pollers and N attempts to bind the metrics port. Instead the active registry version is
+    resolved once here and the workers load it directly, with the exporters off.
+    """
+    settings = load_settings()
+    overrides = {'registry_dir': None, 'metrics_port': None, 'metrics_log_interval': None}
+    if settings['registry_dir']:
+        from model_registry import ModelRegistry
+
+        entry = ModelRegistry(settings['registry_dir']).active()
+        if entry is not None:
+            overrides.update(model_path=entry['path'], backend=entry['backend'])
+    return overrides
+
+
+def _process_segment(input_path, part_path, frame_range, batch_size, cpus, stand_in):
+    """Worker process: classify and encode one frame range on its own CPUs, returning its labels and confidences."""
+    from model_manager import apply_cpu_profile, get_manager
+
+    # This worker's CPU slice replaces the host-wide autotuned profile, which would give every
+    # worker all the threads and the same pinned CPUs
+    apply_cpu_profile(cpus, len(cpus), 1)
+    cv2.setNumThreads(len(cpus))
+    manager = get_manager()
+    # The segments are the parallelism: one in-process model per worker, no nested worker pool
+    manager.workers = 1
+    manager.num_threads = len(cpus)
+    if stand_in:
+        from stand_in_model import use_stand_in_model
+        use_stand_in_model()
+
+    from video_engine import VideoEngine
+
+    labels, confidences = [], []
+
+    def collect(index, frame, label, confidence):
+        labels.append(str(label))
+        confidences.append(float(confidence))
+
+    stats = VideoEngine(batch_size).process(input_path, part_path, on_frame=collect, frame_range=frame_range)
+    return labels, np.asarray(confidences, dtype=np.float32), stats
+
+
+def stitch(part_paths, output_path, fps, size):
+    """
+    Concatenate part files into one video.
+
+    Uses ffmpeg's concat demuxer without re-encoding when ffmpeg is on the PATH; otherwise the
+    parts are decoded and re-encoded with OpenCV.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_path = output_path + '.parts.txt'
+        with open(list_path, 'w') as f:
+            for path in part_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                            '-c', 'copy', output_path], check=True)
+            return
+        except subprocess.CalledProcessError:
+            pass
+        finally:
+            os.remove(list_path)
+
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    try:
+        for path in part_paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        out.release()
+
+
+def process_video_segmented(input_path, output_path, workers=None, batch_size=DEFAULT_BATCH_SIZE, stand_in=False,
+                            timeline=True):
+    """
+    Classify a video in parallel segments and stitch the results.
+
+    Args:
+        input_path (str): Source video.
+        output_path (str): Annotated MP4 to write; labels.csv and labels.json go next to it
+            (as OUTPUT.labels.csv / OUTPUT.labels.json).
+        workers (int, optional): Worker processes; defaults to the CPU count.
+        batch_size (int): Frames per model call inside each worker.
+        stand_in (bool): Use the tiny stand-in model in the workers.
+        timeline (bool): Write the combined label timeline.
+
+    Returns:
+        dict: Frames, segments, workers, elapsed seconds, frames per second, and the labels per frame.
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {input_path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    size = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    workers = workers or os.cpu_count() or 1
+    segments = plan_segments(frame_count, workers)
+    slices = cpu_slices(len(segments))
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_path))) as parts_dir:
+        part_paths = [os.path.join(parts_dir, f"part_{i:04d}.mp4") for i in range(len(segments))]
+        # Spawned workers start without this process's TensorFlow state and load the model once each
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(segments), mp_context=context, initializer=apply_overrides,
+                                 initargs=(_worker_settings(),)) as pool:
+            futures = [
+                pool.submit(_process_segment, input_path, part, frame_range, batch_size, cpus, stand_in)
+                for part, frame_range, cpus in zip(part_paths, segments, slices)
+            ]
+            results = [future.result() for future in futures]
+        stitch(part_paths, output_path, int(fps), size)
+    elapsed = time.perf_counter() - start
+
+    labels = [label for segment_labels, _, _ in results for label in segment_labels]
+    confidences = np.concatenate([segment_confidences for _, segment_confidences, _ in results])
+    if timeline:
+        stem = os.path.splitext(output_path)[0]
+        with LabelTimeline(f"{stem}.labels.csv", f"{stem}.labels.json", fps) as writer:
+            for index, (label, confidence) in enumerate(zip(labels, confidences)):
+                writer.add(index, label, confidence)
+    return {
+        'frames': len(labels),
+        'segments': len(segments),
+        'workers': len(segments),
+        'seconds': elapsed,
+        'fps': len(labels) / elapsed if elapsed > 0 else 0.0,
+        'labels': labels,
+        'confidences': confidences,
+    }
+
+
+def process_video_sequential(input_path, output_path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reference run: one VideoEngine over the whole file in this process, without seeking or frame counts.
+
+    Returns:
+        dict: Elapsed seconds and the labels per frame.
+    """
+    from video_engine import VideoEngine
+
+    labels = []
+    stats = VideoEngine(batch_size).process(
+        input_path, output_path, on_frame=lambda index, frame, label, confidence: labels.append(str(label))
+    )
+    return {'seconds': stats['seconds'], 'labels': labels}
+
+
+def compare_outputs(path_a, path_b):
+    """Frame counts of two videos and the mean absolute pixel difference over their common frames."""
+    cap_a, cap_b = cv2.VideoCapture(path_a), cv2.VideoCapture(path_b)
+    frames_a = frames_b = 0
+    total = 0.0
+    while True:
+        ret_a, frame_a = cap_a.read()
+        ret_b, frame_b = cap_b.read()
+        frames_a += ret_a
+        frames_b += ret_b
+        if not (ret_a and ret_b):
+            break
+        total += float(np.mean(cv2.absdiff(frame_a, frame_b)))
+    # Count whatever is left of the longer video
+    for cap, is_a in ((cap_a, True), (cap_b, False)):
+        while cap.grab():
+            if is_a:
+                frames_a += 1
+            else:
+                frames_b += 1
+    cap_a.release()
+    cap_b.release()
+    common = min(frames_a, frames_b)
+    return frames_a, frames_b, total / common if common else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--verify', action='store_true',
+                        help='Also process the whole file with one VideoEngine and compare frame for frame')
+    parser.add_argument('--scaling', action='store_true', help='Report the speed-up for 1 up to --workers workers')
+    parser.add_argument('--stand-in', action='store_true', help='Use the tiny untrained stand-in model')
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+
+    if args.scaling:
+        counts = [1]
+        while counts[-1] * 2 < args.workers:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != args.workers:
+            counts.append(args.workers)
+        print(f"{'workers':>8}{'seconds':>10}{'frames/s':>10}{'speed-up':>10}  ({cores} cores)")
+        baseline = None
+        for workers in counts:
+            stats = process_video_segmented(args.input, args.output, workers, args.batch_size, args.stand_in,
+                                            timeline=False)
+            baseline = baseline or stats['seconds']
+            print(f"{stats['workers']:>8}{stats['seconds']:>10.1f}{stats['fps']:>10.1f}"
+                  f"{baseline / stats['seconds']:>9.2f}x")
+        return
+
+    stats = process_video_segmented(args.input, args.output, args.workers, args.batch_size, args.stand_in)
+    print(f"{stats['frames']} frames in {stats['segments']} segments: {stats['seconds']:.1f}s, "
+          f"{stats['fps']:.1f} frames/s on {cores} cores")
+    if not args.verify:
+        return
+
+    if args.stand_in:
+        from stand_in_model import use_stand_in_model
+        use_stand_in_model()
+    reference_path = os.path.splitext(args.output)[0] + '.sequential.mp4'
+    reference = process_video_sequential(args.input, reference_path, args.batch_size)
+    frames_a, frames_b, pixel_difference = compare_outputs(args.output, reference_path)
+    mismatched = sum(a != b for a, b in zip(stats['labels'], reference['labels']))
+    print(f"Sequential run: {reference['seconds']:.1f}s, speed-up {reference['seconds'] / stats['seconds']:.2f}x "
+          f"with {stats['workers']} workers on {cores} cores")
+    print(f"Frames: {frames_a} segmented vs {frames_b} sequential; labels differing: {mismatched}; "
+          f"mean pixel difference {pixel_difference:.2f} (encoder keyframes at segment starts)")
+    if frames_a != frames_b or len(stats['labels']) != len(reference['labels']) or mismatched:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Serving model with the preprocessing fused into the graph.
+
+The Python path resizes with PIL or OpenCV, converts to float32 and applies the VGG16
+`preprocess_input` in NumPy, allocating several intermediate arrays per image. The serving
+model instead takes raw uint8 images of any size and does the resize, the colour-order
+handling and the normalization as layers of one compiled graph, for a whole batch at once:
+
+    uint8 (N, H, W, 3) -> float32 -> Resizing(64, 64, nearest) -> 1x1 convolution -> classifier
+
+The fixed 1x1 convolution reorders the channels and subtracts the ImageNet means in one op,
+so the RGB -> BGR flip of the VGG16 "caffe" normalization costs nothing extra, and OpenCV's
+BGR frames need no conversion at all.
+
+On normalization: the EfficientNet-B0 classifier was trained on VGG16-preprocessed inputs,
+so 'caffe' is what reproduces today's predictions. A model retrained with Keras' own
+EfficientNet preprocessing (which is built into the network and expects raw 0..255 pixels)
+would be wrapped with normalization='none'.
+
+Commands:
+    export  Write the serving model as a .keras file.
+    parity  Compare the fused preprocessing and predictions with textile_core's NumPy path.
+
+Examples:
+    python serving_model.py export --output models/TILDA_serving.keras --color-order BGR
+    python serving_model.py parity --images samples/
+"""
+import argparse
+import os
+
+import numpy as np
+
+from textile_core import IMG_SIZE, class_labels
+
+# ImageNet channel means subtracted by the VGG16 ("caffe") preprocessing, in BGR order
+CAFFE_MEANS_BGR = (103.939, 116.779, 123.68)
+
+NORMALIZATIONS = ('caffe', 'none')
+
+
+def _channel_transform(color_order, normalization):
+    """Kernel and bias of the 1x1 convolution mapping input channels to the classifier's expected input."""
+    if color_order not in ('RGB', 'BGR'):
+        raise ValueError(f"Unsupported color order: {color_order}")
+    if normalization not in NORMALIZATIONS:
+        raise ValueError(f"Unknown normalization {normalization!r}, expected one of {NORMALIZATIONS}")
+    kernel = np.zeros((1, 1, 3, 3), dtype=np.float32)
+    if normalization == 'caffe':
+        # Output is BGR: output channel c reads input channel c (BGR input) or 2 - c (RGB input)
+        for c in range(3):
+            kernel[0, 0, c if color_order == 'BGR' else 2 - c, c] = 1.0
+        bias = -np.asarray(CAFFE_MEANS_BGR, dtype=np.float32)
+    else:
+        # Output is RGB in 0..255
+        for c in range(3):
+            kernel[0, 0, c if color_order == 'RGB' else 2 - c, c] = 1.0
+        bias = np.zeros(3, dtype=np.float32)
+    return kernel, bias
+
+
+def build_preprocessing(color_order='RGB', target_size=IMG_SIZE, normalization='caffe'):
+    """
+    Build the preprocessing part of the serving graph on its own.
+
+    Args:
+        color_order (str): Channel order of the raw inputs, 'RGB' (PIL) or 'BGR' (OpenCV).
+        target_size (tuple): Model input size as (height, width).
+        normalization (str): 'caffe' for VGG16 preprocessing, 'none' for raw 0..255 RGB.
+
+    Returns:
+        keras.Model: Maps uint8 (N, H, W, 3) to float32 (N, height, width, 3).
+    """
+    from tensorflow import keras
+
+    kernel, bias = _channel_transform(color_order, normalization)
+    inputs = keras.Input(shape=(None, None, 3), dtype='uint8', name='image')
+    # Keras only autocasts floating inputs; Rescaling(1.0) casts the raw uint8 pixels to float32
+    # exactly and, unlike a Lambda, survives saving and loading the .keras file
+    x = keras.layers.Rescaling(1.0, dtype='float32', name='to_float32')(inputs)
+    x = keras.layers.Resizing(*target_size, interpolation='nearest', name='resize')(x)
+    normalize = keras.layers.Conv2D(3, 1, name='normalize', trainable=False)
+    x = normalize(x)
+    normalize.set_weights([kernel, bias])
+    return keras.Model(inputs, x, name='preprocessing')
+
+
+def build_serving_model(model, color_order='RGB', normalization='caffe'):
+    """
+    Wrap a classifier so it accepts raw uint8 images of any size.
+
+    Args:
+        model (keras.Model): Classifier taking preprocessed (N, 64, 64, 3) float32 inputs.
+        color_order (str): Channel order of the raw inputs, 'RGB' (PIL) or 'BGR' (OpenCV).
+        normalization (str): The normalization the classifier was trained with, see the module docstring.
+
+    Returns:
+        keras.Model: Maps uint8 (N, H, W, 3) to class probabilities (N, classes).
+    """
+    from tensorflow import keras
+
+    preprocessing = build_preprocessing(color_order, tuple(model.input_shape[1:3]), normalization)
+    inputs = keras.Input(shape=(None, None, 3), dtype='uint8', name='image')
+    return keras.Model(inputs, model(preprocessing(inputs)), name=f"{model.name}_serving")
+
+
+class FusedPredictor:
+    """
+    Runs a serving model on raw uint8 images through one traced graph.
+
+    The graph is traced once with a fully dynamic uint8 signature, so new image sizes never
+    retrace it. Images of different sizes cannot share a tensor and are classified in one call
+    per size; video frames all share one size and go through in a single call.
+    """
+
+    def __init__(self, serving_model):
+        """
+        Args:
+            serving_model (keras.Model): Output of build_serving_model, or the same model loaded from disk.
+        """
+        import tensorflow as tf
+
+        self.model = serving_model
+        self._forward = tf.function(
+            lambda x: serving_model(x, training=False),
+            input_signature=[tf.TensorSpec((None, None, None, 3), tf.uint8)],
+        )
+
+    def predict(self, images):
+        """
+        Classify raw images.
+
+        Args:
+            images (list | np.ndarray): uint8 arrays of shape (H, W, 3), or one (N, H, W, 3) array.
+
+        Returns:
+            np.ndarray: Class probabilities of shape (N, classes).
+        """
+        if isinstance(images, np.ndarray) and images.ndim == 4:
+            return self._forward(np.ascontiguousarray(images, dtype=np.uint8)).numpy()
+        images = list(images)
+        probabilities = np.empty((len(images), len(class_labels)), dtype=np.float32)
+        by_shape = {}
+        for i, image in enumerate(images):
+            by_shape.setdefault(image.shape, []).append(i)
+        for indices in by_shape.values():
+            batch = np.stack([images[i] for i in indices]).astype(np.uint8, copy=False)
+            probabilities[indices] = self._forward(batch).numpy()
+        return probabilities
+
+    def predict_labels(self, images):
+        """Classify raw images and return (labels, confidences), like textile_core.predict_frames."""
+        probabilities = self.predict(images)
+        predicted = np.argmax(probabilities, axis=1)
+        labels = np.asarray(class_labels, dtype=object)[predicted]
+        return labels, probabilities[np.arange(len(probabilities)), predicted]
+
+
+def parity(model, image_paths, batch_size=32):
+    """
+    Compare the fused graph with textile_core's NumPy preprocessing on the same images.
+
+    Args:
+        model (keras.Model): The classifier.
+        image_paths (list): Images to compare on; decoded with PIL at full resolution.
+        batch_size (int): Images per comparison batch.
+
+    Returns:
+        dict: Preprocessed-tensor drift, share of identical pixels, label agreement and confidence drift.
+    """
+    from PIL import Image
+
+    from textile_core import preprocess_batch
+
+    preprocessing = build_preprocessing('RGB', tuple(model.input_shape[1:3]))
+    predictor = FusedPredictor(build_serving_model(model, 'RGB'))
+    tensor_drift, identical, agree, confidence_drift = [], 0, 0, []
+    for start in range(0, len(image_paths), batch_size):
+        paths = image_paths[start:start + batch_size]
+        raw = [np.asarray(Image.open(path).convert('RGB')) for path in paths]
+        expected = preprocess_batch(paths)
+        for image, reference in zip(raw, expected):
+            fused = preprocessing(image[None]).numpy()[0]
+            difference = np.abs(fused - reference)
+            tensor_drift.append(float(difference.max()))
+            identical += int(np.all(difference < 1e-3))
+        reference_probabilities = model.predict(expected, verbose=0)
+        fused_probabilities = predictor.predict(raw)
+        labels = np.argmax(reference_probabilities, axis=1)
+        agree += int(np.sum(labels == np.argmax(fused_probabilities, axis=1)))
+        rows = np.arange(len(labels))
+        confidence_drift.append(np.abs(reference_probabilities[rows, labels] - fused_probabilities[rows, labels]))
+    confidence_drift = np.concatenate(confidence_drift)
+    return {
+        'images': len(image_paths),
+        'identical_inputs': identical / len(image_paths),
+        'max_input_drift': max(tensor_drift),
+        'label_agreement': agree / len(image_paths),
+        'max_confidence_drift': float(np.max(confidence_drift)),
+    }
+
+
+def main():
+    from backends import KerasBackend
+    from bulk_classify import list_images
+    from model_manager import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Write the serving model')
+    export.add_argument('--model', default=MODEL_PATH, help='Path to the Keras .h5 model')
+    export.add_argument('--output', default='models/TILDA_serving.keras', help='Where to write the serving model')
+    export.add_argument('--color-order', default='RGB', choices=['RGB', 'BGR'], help='Channel order of the raw inputs')
+    export.add_argument('--normalization', default='caffe', choices=NORMALIZATIONS)
+
+    check = commands.add_parser('parity', help='Compare the fused graph with the NumPy preprocessing')
+    check.add_argument('--model', default=MODEL_PATH, help='Path to the Keras .h5 model')
+    check.add_argument('--images', required=True, help='Folder of images to compare on')
+    check.add_argument('--limit', type=int, help='Maximum number of images')
+    args = parser.parse_args()
+
+    model = KerasBackend.load(args.model).model
+    if args.command == 'export':
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        build_serving_model(model, args.color_order, args.normalization).save(args.output)
+        print(f"Wrote {args.output}")
+    else:
+        paths = list_images(args.images, args.limit)
+        if not paths:
+            parser.error(f"No images found in {args.images}")
+        report = parity(model, paths)
+        print(f"Images compared:       {report['images']}")
+        print(f"Identical model input: {report['identical_inputs']:.2%} (max drift {report['max_input_drift']:.3f})")
+        print(f"Label agreement:       {report['label_agreement']:.2%}")
+        print(f"Max confidence drift:  {report['max_confidence_drift']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
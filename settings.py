@@ -0,0 +1,111 @@
+import json
+import os
+
+# JSON file holding deployment settings; every key is optional
+CONFIG_PATH = os.environ.get('TEXTILE_CONFIG', 'textile_config.json')
+
+DEFAULTS = {
+    # Inference backend: 'keras', 'tflite' or 'onnx'
+    'backend': 'keras',
+    # Model artifact for the selected backend (.h5, .tflite or .onnx)
+    'model_path': 'TILDA_model_efficientNet-B0.h5',
+    # CPU threads used by the TFLite and ONNX Runtime backends (None lets the runtime decide)
+    'num_threads': None,
+    # Inference worker processes (see worker_pool.py); 0 or 1 runs the model in the calling process
+    'workers': 0,
+    # CPU profile, written by `python autotune.py`: images per model call, TensorFlow thread pools
+    # (per worker with a pool: None gives each an equal share of the CPUs) and the CPU ids to pin to
+    'batch_size': 32,
+    'intra_op_threads': None,
+    'inter_op_threads': None,
+    'cpu_affinity': None,
+    # Versioned model registry to serve from (see model_registry.py); overrides model_path and backend
+    'registry_dir': None,
+    'registry_poll_seconds': 5.0,
+    # Labelled folder (one subfolder per class) a new model must classify before it is swapped in
+    'validation_dir': None,
+    'validation_min_accuracy': 0.9,
+    # Calibrated "Good" pre-filter from `python cascade.py calibrate` (None runs the full model on every input)
+    'cascade_path': None,
+    # Prediction cache: in-memory LRU bounds and optional persistent directory
+    'cache_max_entries': 1024,
+    'cache_max_mb': 16,
+    'cache_dir': None,
+    # Server streaming large processed videos and label timelines from disk: its port, the URL
+    # browsers reach it under (both needed to use it) and the interface it binds. Without it,
+    # results are offered through Streamlit download buttons.
+    'download_port': None,
+    'download_base_url': None,
+    'download_host': '127.0.0.1',
+    # Hot-path instrumentation (see instrumentation.py); off unless enabled
+    'metrics_enabled': False,
+    'metrics_port': None,
+    # Interface the metrics endpoint binds, and whether it also serves /profile (cProfile on demand)
+    'metrics_host': '127.0.0.1',
+    'metrics_profile_enabled': False,
+    'metrics_log_interval': None,
+}
+
+# Environment variables take precedence over the config file
+ENV_OVERRIDES = {
+    'backend': 'TEXTILE_BACKEND',
+    'model_path': 'TEXTILE_MODEL_PATH',
+    'workers': 'TEXTILE_WORKERS',
+    'registry_dir': 'TEXTILE_REGISTRY',
+}
+
+# JSON object of settings a process hands down to its workers (see apply_overrides); wins over everything else
+OVERRIDES_VARIABLE = 'TEXTILE_SETTINGS'
+
+
+def load_settings(path=CONFIG_PATH):
+    """
+    Load deployment settings from the defaults, the JSON config file and environment variables.
+
+    Args:
+        path (str): Path to the JSON config file; a missing file is not an error.
+
+    Returns:
+        dict: Merged settings.
+    """
+    settings = dict(DEFAULTS)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            settings.update(json.load(f))
+    for key, variable in ENV_OVERRIDES.items():
+        if os.environ.get(variable):
+            settings[key] = os.environ[variable]
+    if os.environ.get(OVERRIDES_VARIABLE):
+        settings.update(json.loads(os.environ[OVERRIDES_VARIABLE]))
+    return settings
+
+
+def apply_overrides(overrides):
+    """
+    Override settings in this process and the processes it starts, e.g. as a worker pool initializer.
+
+    Modules read their settings when first imported, so this only affects modules imported afterwards.
+
+    Args:
+        overrides (dict): Settings taking precedence over the config file and environment variables.
+    """
+    current = json.loads(os.environ.get(OVERRIDES_VARIABLE) or '{}')
+    current.update(overrides)
+    os.environ[OVERRIDES_VARIABLE] = json.dumps(current)
+
+
+def save_settings(updates, path=CONFIG_PATH):
+    """
+    Merge `updates` into the JSON config file, keeping keys it does not mention.
+
+    Args:
+        updates (dict): Settings to write.
+        path (str): Path to the JSON config file.
+    """
+    current = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            current = json.load(f)
+    current.update(updates)
+    with open(path, 'w') as f:
+        json.dump(current, f, indent=2, sort_keys=True)
@@ -0,0 +1,35 @@
+from textile_core import IMG_SIZE, class_labels
+
+
+def build_stand_in_model(seed=0):
+    """
+    Build a tiny untrained Keras model with the same input and output shape as the real one.
+
+    It lets the server, load tests and benchmarks run anywhere without the trained
+    EfficientNet-B0 weights. Its predictions are meaningless but deterministic for a seed.
+
+    Args:
+        seed (int): Seed for the weight initialisation.
+
+    Returns:
+        keras.Model: Model mapping (N, 64, 64, 3) float32 inputs to (N, 5) class probabilities.
+    """
+    from tensorflow import keras
+
+    keras.utils.set_random_seed(seed)
+    inputs = keras.Input(shape=(*IMG_SIZE, 3))
+    x = keras.layers.Rescaling(1 / 255.0)(inputs)
+    x = keras.layers.Conv2D(8, 3, strides=2, activation='relu')(x)
+    x = keras.layers.Conv2D(16, 3, strides=2, activation='relu')(x)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    outputs = keras.layers.Dense(len(class_labels), activation='softmax')(x)
+    return keras.Model(inputs, outputs, name='stand_in')
+
+
+def use_stand_in_model(seed=0):
+    """Install a stand-in model in the process-wide model manager and return it."""
+    from model_manager import get_manager
+
+    model = build_stand_in_model(seed)
+    get_manager().set_model(model)
+    return model
@@ -0,0 +1,81 @@
+"""
+Measure cold-start behaviour of the classifier.
+
+Each scenario runs in a fresh Python process and reports:
+  * import_to_ready: seconds from the start of the import until the module can serve the page
+  * first_prediction: latency of the first prediction a user triggers
+
+Scenarios:
+  * eager: the previous behaviour, load_model at import time and a cold first model.predict
+  * lazy:  textile_core with the model manager, warm-up started in the background at import
+
+Usage:
+    python startup_timing.py [--model PATH] [--think-time SECONDS]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def _run_eager(model_path, think_time):
+    start = time.perf_counter()
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.applications.vgg16 import preprocess_input
+    import numpy as np
+    model = load_model(model_path)
+    ready = time.perf_counter() - start
+
+    time.sleep(think_time)
+    image = preprocess_input(np.zeros((1, 64, 64, 3), dtype=np.float32))
+    start = time.perf_counter()
+    model.predict(image)
+    return ready, time.perf_counter() - start
+
+
+def _run_lazy(model_path, think_time):
+    os.environ['TEXTILE_MODEL_PATH'] = model_path
+    start = time.perf_counter()
+    import numpy as np
+    import textile_core
+    thread = textile_core.warm_up(background=True)
+    ready = time.perf_counter() - start
+
+    # The user needs a moment to pick a file; give the warm-up at least that long
+    thread.join(think_time if think_time > 0 else None)
+    start = time.perf_counter()
+    textile_core.predict_batch([np.zeros((64, 64, 3), dtype=np.uint8)], batch_size=1)
+    return ready, time.perf_counter() - start
+
+
+SCENARIOS = {'eager': _run_eager, 'lazy': _run_lazy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='TILDA_model_efficientNet-B0.h5', help='Path to the Keras model')
+    parser.add_argument('--think-time', type=float, default=5.0,
+                        help='Seconds between the page being ready and the first prediction')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        ready, first = SCENARIOS[args.scenario](args.model, args.think_time)
+        print(json.dumps({'import_to_ready': ready, 'first_prediction': first}))
+        return
+
+    print(f"{'scenario':<10}{'import_to_ready (s)':>22}{'first_prediction (s)':>24}")
+    for scenario in ('eager', 'lazy'):
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--scenario', scenario,
+             '--model', args.model, '--think-time', str(args.think_time)],
+            capture_output=True, text=True, check=True,
+        )
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{scenario:<10}{timings['import_to_ready']:>22.3f}{timings['first_prediction']:>24.3f}")
+
+
+if __name__ == '__main__':
+    main()
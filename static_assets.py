@@ -0,0 +1,115 @@
+"""
+Page assets (logos) prepared once per process instead of once per Streamlit rerun.
+
+Each image is resized to the width it is displayed at, encoded and turned into a data URI
+the first time it is requested. The result is kept in a module-level cache, so every session
+served by the process shares it. An entry is rebuilt when the file's mtime changes.
+
+Run `python static_assets.py` to compare the inline image payload and the per-rerun
+preparation time of both apps with the previous read-and-base64 approach.
+"""
+import base64
+import io
+import os
+import threading
+import time
+
+from PIL import Image
+
+# Encode at twice the CSS width so logos stay sharp on high-density screens
+PIXEL_RATIO = 2
+
+JPEG_QUALITY = 90
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _encode(path, width):
+    with Image.open(path) as image:
+        target = width * PIXEL_RATIO
+        if image.format == 'JPEG':
+            # Let libjpeg decode at a reduced scale instead of decoding the full image
+            image.draft('RGB', (target, target))
+        if image.width > target:
+            factor = image.width // (target * 2)
+            if factor > 1:
+                # Cheap box reduction by an integer factor, then a quality resample of the small image
+                image = image.reduce(factor)
+            image = image.resize((target, max(round(image.height * target / image.width), 1)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Keep transparency
+            image.save(buffer, 'PNG', optimize=True)
+            mime = 'image/png'
+        else:
+            image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            mime = 'image/jpeg'
+    return f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def asset_data_uri(path, width):
+    """
+    Return a data URI of an image resized to the width it is displayed at.
+
+    Args:
+        path (str): Image file; relative paths are resolved against this module's directory.
+        width (int): Displayed width in CSS pixels.
+
+    Returns:
+        str: `data:<mime>;base64,...`, ready for an <img src>.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, width)
+    entry = _cache.get(key)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != mtime:
+            entry = _cache[key] = (mtime, _encode(path, width))
+    return entry[1]
+
+
+def clear():
+    """Forget every prepared asset."""
+    with _lock:
+        _cache.clear()
+
+
+# (file, displayed width) of every inline image rendered on each rerun
+PAGE_ASSETS = {
+    'app.py': [('logo.png', 150), ('logo.png', 70)],
+    'app1.py': [('insight_wave.jpg', 100), ('insight_wave.jpg', 130), ('logo.png', 70)],
+}
+
+
+def _inline_before(path):
+    """What the apps did on every rerun before: read the whole file and base64 it."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), path), 'rb') as f:
+        return base64.b64encode(f.read()).decode()
+
+
+def _time_ms(run, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        run()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def main(repeats=20):
+    print(f"{'page':<10}{'before KB':>11}{'after KB':>10}{'before ms':>11}{'first ms':>10}{'cached ms':>11}")
+    for page, assets in PAGE_ASSETS.items():
+        before = sum(len(_inline_before(path)) for path, _ in assets)
+        before_ms = _time_ms(lambda: [_inline_before(path) for path, _ in assets], repeats)
+        clear()
+        start = time.perf_counter()
+        after = sum(len(asset_data_uri(path, width)) for path, width in assets)
+        first_ms = (time.perf_counter() - start) * 1000
+        cached_ms = _time_ms(lambda: [asset_data_uri(path, width) for path, width in assets], repeats)
+        print(f"{page:<10}{before / 1024:>11.1f}{after / 1024:>10.1f}{before_ms:>11.2f}{first_ms:>10.1f}{cached_ms:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
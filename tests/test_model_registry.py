@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('tensorflow')
+
+from backends import Backend, TFLiteBackend
+from model_registry import validate_model
+from textile_core import IMG_SIZE, class_labels
+
+
+class FixedOutputs(Backend):
+    """Returns the same probability row for every input."""
+
+    def __init__(self, row):
+        self.row = np.asarray(row, dtype=np.float32)
+
+    @property
+    def input_shape(self):
+        return (None, *IMG_SIZE, 3)
+
+    def predict(self, batch):
+        return np.tile(self.row, (len(batch), 1))
+
+
+def test_accepts_rounded_probabilities():
+    # Every class rounded down by most of an int8 step
+    row = np.full(len(class_labels), 1 / len(class_labels)) - 0.0015
+    validate_model(FixedOutputs(row))
+
+
+def test_rejects_outputs_that_are_not_probabilities():
+    with pytest.raises(ValueError):
+        validate_model(FixedOutputs(np.full(len(class_labels), 0.5)))
+
+
+def test_accepts_int8_tflite_model(tmp_path):
+    import tensorflow as tf
+
+    from stand_in_model import build_stand_in_model
+
+    rng = np.random.default_rng(0)
+    converter = tf.lite.TFLiteConverter.from_keras_model(build_stand_in_model())
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = lambda: (
+        [rng.uniform(-120, 150, (1, *IMG_SIZE, 3)).astype(np.float32)] for _ in range(16)
+    )
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    path = tmp_path / 'stand_in_int8.tflite'
+    path.write_bytes(converter.convert())
+
+    validate_model(TFLiteBackend(str(path)))
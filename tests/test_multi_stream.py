@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+pytest.importorskip('tensorflow')
+
+from multi_stream import MultiStreamScheduler
+
+
+class FiniteCapture:
+    """Stands in for LatestFrameCapture: delivers a few frames, then ends like a finished file."""
+
+    def __init__(self, source, frames, notify):
+        self.source = source
+        self.notify = notify
+        self._frames = frames
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.failed = False
+
+    def start(self):
+        self.notify.set()
+        return True
+
+    def stop(self):
+        pass
+
+    @property
+    def active(self):
+        return not self.failed
+
+    def read(self, timeout=1.0):
+        with self._lock:
+            if self.captured == self._frames:
+                self.failed = True
+                self.notify.set()
+                return False, None, None
+            self.captured += 1
+            return True, np.zeros((8, 8, 3), dtype=np.uint8), time.perf_counter()
+
+
+def classify(frames):
+    return ['Good'] * len(frames), [1.0] * len(frames)
+
+
+def test_stops_when_every_source_ends():
+    scheduler = MultiStreamScheduler(['a.mp4', 'b.mp4'], batch_size=4, classify=classify)
+    scheduler.captures = [
+        FiniteCapture(source, frames, scheduler._ready) for source, frames in zip(scheduler.sources, (3, 5))
+    ]
+    calls = 0
+    collect = scheduler._collect
+
+    def counted_collect():
+        nonlocal calls
+        calls += 1
+        return collect()
+
+    scheduler._collect = counted_collect
+    scheduler.start()
+    try:
+        deadline = time.perf_counter() + 5.0
+        while scheduler.running and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert not scheduler.running
+    finally:
+        scheduler.stop()
+
+    assert scheduler.error is None
+    assert [row['classified'] for row in scheduler.snapshot()] == [3, 5]
+    # Stopping must not busy-loop the scheduler thread
+    assert calls < 50
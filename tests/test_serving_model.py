@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('tensorflow')
+Image = pytest.importorskip('PIL.Image')
+
+from serving_model import build_preprocessing, parity
+from stand_in_model import build_stand_in_model
+from textile_core import IMG_SIZE, preprocess_batch
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    # Sizes at whole multiples of the model input, where every nearest-neighbour resize picks the same pixels
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, (height, width) in enumerate([IMG_SIZE, (128, 128), (192, 128), (256, 320)]):
+        path = tmp_path / f"image_{i}.png"
+        Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_preprocessing_casts_uint8_to_float32(image_paths):
+    image = np.asarray(Image.open(image_paths[1]).convert('RGB'))
+    output = build_preprocessing('RGB')(image[None]).numpy()
+
+    assert output.dtype == np.float32
+    np.testing.assert_allclose(output, preprocess_batch([image_paths[1]]), atol=1e-3)
+
+
+def test_bgr_input_matches_rgb_input(image_paths):
+    image = np.asarray(Image.open(image_paths[2]).convert('RGB'))
+    rgb = build_preprocessing('RGB')(image[None]).numpy()
+    bgr = build_preprocessing('BGR')(np.ascontiguousarray(image[None, ..., ::-1])).numpy()
+
+    np.testing.assert_allclose(rgb, bgr, atol=1e-3)
+
+
+def test_parity_with_textile_core(image_paths):
+    report = parity(build_stand_in_model(), image_paths, batch_size=3)
+
+    assert report['identical_inputs'] == 1.0
+    assert report['label_agreement'] == 1.0
+    assert report['max_confidence_drift'] < 1e-4
@@ -0,0 +1,24 @@
+import json
+
+from settings import OVERRIDES_VARIABLE, apply_overrides, load_settings
+
+
+def test_overrides_win_over_file_and_environment(tmp_path, monkeypatch):
+    config = tmp_path / 'textile_config.json'
+    config.write_text(json.dumps({'metrics_port': 9100}))
+    monkeypatch.setenv('TEXTILE_REGISTRY', '/models')
+    monkeypatch.setenv(OVERRIDES_VARIABLE, '{}')
+
+    apply_overrides({'registry_dir': None})
+    apply_overrides({'metrics_port': None})
+    settings = load_settings(str(config))
+
+    assert settings['registry_dir'] is None
+    assert settings['metrics_port'] is None
+
+
+def test_without_overrides_environment_wins(tmp_path, monkeypatch):
+    monkeypatch.setenv('TEXTILE_REGISTRY', '/models')
+    monkeypatch.setenv(OVERRIDES_VARIABLE, '{}')
+
+    assert load_settings(str(tmp_path / 'missing.json'))['registry_dir'] == '/models'
@@ -0,0 +1,28 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('tensorflow')
+Image = pytest.importorskip('PIL.Image')
+
+from textile_core import IMG_SIZE, frames_to_rgb, load_rgb_array
+
+SIZES = [IMG_SIZE, (97, 131), (480, 640), (1080, 1920), (40, 50)]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_frames_and_arrays_resize_identically(size):
+    rgb = np.random.default_rng(0).integers(0, 256, (*size, 3), dtype=np.uint8)
+    bgr = np.ascontiguousarray(rgb[..., ::-1])
+
+    np.testing.assert_array_equal(frames_to_rgb([bgr], 'BGR')[0], load_rgb_array(rgb))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_frames_and_files_resize_identically(tmp_path, size):
+    rgb = np.random.default_rng(1).integers(0, 256, (*size, 3), dtype=np.uint8)
+    path = tmp_path / 'image.png'
+    Image.fromarray(rgb).save(path)
+
+    frame = cv2.imread(str(path))
+    np.testing.assert_array_equal(frames_to_rgb([frame], 'BGR')[0], load_rgb_array(str(path)))
@@ -1,37 +1,399 @@
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array, load_img
+from tensorflow.keras.preprocessing.image import img_to_array
 from tensorflow.keras.applications.vgg16 import preprocess_input
+from PIL import Image
+import io
 import numpy as np
-
-# Load the pre-trained model
-model = load_model('TILDA_model_efficientNet-B0.h5')
+import cv2
+import instrumentation
+from instrumentation import stage
+from cascade import get_cascade
+from model_manager import get_manager, get_model
+from settings import load_settings
 
 # Class labels for textile classification
 class_labels = ['Good', 'Hole', 'Objects', 'Oil Spot', 'Thread Error']
 
-def predict_image(file_path):
+# Model input size as (height, width)
+IMG_SIZE = (64, 64)
+
+# Number of images sent to the model per inference call; tuned per host by `python autotune.py`
+DEFAULT_BATCH_SIZE = int(load_settings()['batch_size'])
+
+# Longest side uploads are decoded to; enough for display, far above the model input size
+UPLOAD_MAX_SIDE = 1024
+
+# Serve or log the hot-path metrics if enabled in the settings
+instrumentation.start_exporters()
+
+
+def load_rgb_array(item, target_size=IMG_SIZE):
+    """
+    Decode a single input into an RGB float32 array of the model input size.
+
+    Args:
+        item (str | PIL.Image.Image | np.ndarray): Path to an image file, a PIL image
+            or an RGB array of shape (H, W, 3) (grayscale and RGBA are accepted too).
+        target_size (tuple): Output size as (height, width).
+
+    Returns:
+        np.ndarray: Array of shape (height, width, 3) and dtype float32.
+    """
+    height, width = target_size
+    if isinstance(item, np.ndarray):
+        array = item
+        if array.ndim == 2:
+            array = np.stack([array] * 3, axis=-1)
+        elif array.shape[-1] == 4:
+            array = array[..., :3]
+        if array.shape[:2] != (height, width):
+            # Same nearest-neighbour resize load_img applies to files
+            with stage('resize'):
+                image = Image.fromarray(np.ascontiguousarray(array, dtype=np.uint8))
+                array = np.asarray(image.resize((width, height), Image.NEAREST))
+        return array.astype(np.float32, copy=False)
+    if not isinstance(item, Image.Image):
+        # File path: the same read, decode and resize steps as keras load_img, timed separately
+        with stage('read'):
+            with open(item, 'rb') as f:
+                data = f.read()
+        with stage('decode'):
+            item = Image.open(io.BytesIO(data))
+            item.load()
+    with stage('resize'):
+        if item.mode != 'RGB':
+            item = item.convert('RGB')
+        if item.size != (width, height):
+            item = item.resize((width, height), Image.NEAREST)
+    return img_to_array(item)
+
+
+def decode_upload(data, max_side=UPLOAD_MAX_SIDE):
+    """
+    Decode an uploaded image from memory, once, at no more than the resolution it is used at.
+
+    JPEGs are decoded with libjpeg's DCT scaling (PIL draft mode), so a large photo is never
+    expanded to full resolution; other formats are decoded and then shrunk.
+
+    Args:
+        data (bytes | memoryview): Encoded image, e.g. `uploaded_file.getbuffer()`.
+        max_side (int, optional): Longest side of the returned image; None keeps full resolution.
+
+    Returns:
+        PIL.Image.Image: The decoded RGB image, for both display and inference.
+    """
+    with stage('decode'):
+        image = Image.open(io.BytesIO(data))
+        if max_side and image.format == 'JPEG' and max(image.size) > max_side:
+            # DCT scaling halves the size in steps and keeps it at or above the request, so asking
+            # for half of max_side yields a longest side in [max_side / 2, max_side) without resampling
+            scale = max_side / 2 / max(image.size)
+            image.draft('RGB', (int(image.width * scale) + 1, int(image.height * scale) + 1))
+        image.load()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return image
+
+
+def _frame_to_rgb(frame, color_order='BGR', target_size=IMG_SIZE):
+    """
+    Convert a video frame to an RGB float32 array of the model input size, entirely in memory.
+
+    Args:
+        frame (np.ndarray): uint8 frame of shape (H, W, 3), as returned by OpenCV.
+        color_order (str): Channel order of the frame, 'BGR' (OpenCV) or 'RGB'.
+        target_size (tuple): Output size as (height, width).
+
+    Returns:
+        np.ndarray: Array of shape (height, width, 3) and dtype float32.
+    """
+    height, width = target_size
+    with stage('resize'):
+        if frame.shape[:2] != (height, width):
+            # Resize first so the colour conversion only touches the small image; INTER_NEAREST_EXACT
+            # picks the same source pixels as PIL's NEAREST, so frames and files get identical inputs
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_NEAREST_EXACT)
+        if color_order == 'BGR':
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        elif color_order != 'RGB':
+            raise ValueError(f"Unsupported color order: {color_order}")
+    return frame.astype(np.float32)
+
+
+def frames_to_rgb(frames, color_order='BGR', target_size=IMG_SIZE):
+    """
+    Resize several video frames into one contiguous RGB float32 array, before model normalization.
+
+    Args:
+        frames (list): uint8 frames of shape (H, W, 3).
+        color_order (str): Channel order of the frames, 'BGR' or 'RGB'.
+        target_size (tuple): Model input size as (height, width).
+
+    Returns:
+        np.ndarray: Array of shape (N, height, width, 3) with values in [0, 255].
+    """
+    batch = np.empty((len(frames), *target_size, 3), dtype=np.float32)
+    for i, frame in enumerate(frames):
+        batch[i] = _frame_to_rgb(frame, color_order, target_size)
+    return batch
+
+
+def load_rgb_batch(inputs, target_size=IMG_SIZE):
+    """
+    Decode several inputs into one contiguous RGB float32 array, before model normalization.
+
+    Args:
+        inputs (list): File paths, PIL images or RGB arrays, in any mix.
+        target_size (tuple): Model input size as (height, width).
+
+    Returns:
+        np.ndarray: Array of shape (N, height, width, 3) with values in [0, 255].
+    """
+    batch = np.empty((len(inputs), *target_size, 3), dtype=np.float32)
+    for i, item in enumerate(inputs):
+        batch[i] = load_rgb_array(item, target_size)
+    return batch
+
+
+def preprocess_frames(frames, color_order='BGR', target_size=IMG_SIZE):
+    """
+    Convert several video frames into one contiguous model-ready array.
+
+    Args:
+        frames (list): uint8 frames of shape (H, W, 3).
+        color_order (str): Channel order of the frames, 'BGR' or 'RGB'.
+        target_size (tuple): Model input size as (height, width).
+
+    Returns:
+        np.ndarray: Array of shape (N, height, width, 3) ready for the model.
+    """
+    batch = frames_to_rgb(frames, color_order, target_size)
+    with stage('preprocess'):
+        return preprocess_input(batch)
+
+
+def preprocess_batch(inputs, target_size=IMG_SIZE):
+    """
+    Decode and preprocess several inputs into one contiguous model-ready array.
+
+    Args:
+        inputs (list): File paths, PIL images or RGB arrays, in any mix.
+        target_size (tuple): Model input size as (height, width).
+
+    Returns:
+        np.ndarray: Array of shape (N, height, width, 3) ready for the model.
+    """
+    batch = load_rgb_batch(inputs, target_size)
+    with stage('preprocess'):
+        return preprocess_input(batch)
+
+
+def _infer(batch):
+    """Run the configured backend on an already preprocessed batch and return the class probabilities."""
+    with stage('inference'), get_manager().lease() as model:
+        return model.predict(batch)
+
+
+def warm_up(background=True):
+    """
+    Load the model and run one inference through the prediction path, so the first
+    user request pays neither the load nor the graph tracing cost.
+
+    Args:
+        background (bool): Run in a daemon thread and return immediately.
+    """
+    if background:
+        return get_manager().start_warm_up()
+    get_manager().warm_up()
+
+
+def __getattr__(name):
+    # Keep `textile_core.model` working without loading the model at import time
+    if name == 'model':
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def predict_probabilities(batch, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Run chunked inference on a preprocessed batch.
+
+    Args:
+        batch (np.ndarray): Preprocessed array of shape (N, height, width, 3).
+        batch_size (int): Maximum number of images sent to the model per call.
+
+    Returns:
+        np.ndarray: Class probabilities of shape (N, len(class_labels)).
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be positive, got {batch_size}")
+    if len(batch) == 0:
+        return np.empty((0, len(class_labels)), dtype=np.float32)
+    return np.concatenate(
+        [_infer(batch[start:start + batch_size]) for start in range(0, len(batch), batch_size)]
+    )
+
+
+def predict_preprocessed(batch, batch_size):
+    """Run chunked inference on a preprocessed batch and map the results to labels and confidences."""
+    if len(batch) == 0:
+        return np.array([], dtype=object), np.array([], dtype=np.float32)
+
+    predictions = predict_probabilities(batch, batch_size)
+    predicted_classes = np.argmax(predictions, axis=1)
+    confidences = predictions[np.arange(len(predictions)), predicted_classes]
+
+    # Map the predicted class indices to the corresponding labels
+    labels = np.asarray(class_labels, dtype=object)[predicted_classes]
+    return labels, confidences
+
+
+def classify_rgb(batch, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Classify a batch of model-sized RGB arrays, letting the Good pre-filter answer first when enabled.
+
+    Args:
+        batch (np.ndarray): Array of shape (N, height, width, 3) with values in [0, 255], as returned
+            by load_rgb_batch or frames_to_rgb. It is normalized in place.
+        batch_size (int): Maximum number of images sent to the model per call.
+
+    Returns:
+        tuple: Array of predicted class labels and array of confidence scores, one entry per image.
+    """
+    gate = get_cascade()
+    if gate is None:
+        with stage('preprocess'):
+            return predict_preprocessed(preprocess_input(batch), batch_size)
+
+    with stage('cascade'):
+        accepted = gate.accept(batch)
+    instrumentation.count('cascade_accepted', int(accepted.sum()))
+    labels = np.full(len(batch), 'Good', dtype=object)
+    confidences = np.full(len(batch), gate.confidence, dtype=np.float32)
+    escalated = ~accepted
+    if escalated.any():
+        # Only the inputs the gate is unsure about pay for the full model
+        with stage('preprocess'):
+            selected = preprocess_input(batch[escalated])
+        labels[escalated], confidences[escalated] = predict_preprocessed(selected, batch_size)
+    return labels, confidences
+
+
+def predict_batch(inputs, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Function to preprocess several images and predict their classes in as few model calls as possible.
+
+    Args:
+        inputs (list): File paths, PIL images or RGB arrays of shape (H, W, 3).
+        batch_size (int): Maximum number of images sent to the model per call.
+
+    Returns:
+        tuple: Array of predicted class labels and array of confidence scores, one entry per input.
+    """
+    inputs = list(inputs)
+    instrumentation.count('images', len(inputs))
+    try:
+        with instrumentation.profiled():
+            return classify_rgb(load_rgb_batch(inputs), batch_size)
+    except Exception as e:
+        raise RuntimeError(f"Error during prediction: {e}")
+
+
+def predict_image(file_path, cache=None):
     """
     Function to preprocess an image and predict its class using the loaded model.
 
     Args:
         file_path (str): Path to the image file.
+        cache (PredictionCache, optional): Reuse the result for identical file contents.
+
+    Returns:
+        tuple: Predicted class label and confidence score.
+    """
+    def compute():
+        labels, confidences = predict_batch([file_path], batch_size=1)
+        return str(labels[0]), float(confidences[0])
+
+    if cache is None:
+        return compute()
+    with open(file_path, 'rb') as f:
+        key = cache.key_for_bytes(f.read())
+    return cache.get_or_compute(key, compute)
+
+
+def predict_upload(data, image=None, cache=None, max_side=UPLOAD_MAX_SIDE):
+    """
+    Function to classify an uploaded image straight from memory, without a temporary file.
+
+    Args:
+        data (bytes | memoryview): Encoded image, e.g. `uploaded_file.getbuffer()`.
+        image (PIL.Image.Image, optional): `data` already decoded by decode_upload with the same
+            `max_side`, e.g. for display; it is decoded here only when missing and not cached.
+        cache (PredictionCache, optional): Reuse the result for identical uploads.
+        max_side (int, optional): Decode resolution, see decode_upload.
+
+    Returns:
+        tuple: Predicted class label and confidence score.
+    """
+    def compute():
+        decoded = image if image is not None else decode_upload(data, max_side)
+        labels, confidences = predict_batch([decoded], batch_size=1)
+        return str(labels[0]), float(confidences[0])
+
+    if cache is None:
+        return compute()
+    # The decode resolution changes the input the model sees, so it is part of the key
+    return cache.get_or_compute(f"{cache.key_for_bytes(data)}-{max_side}", compute)
+
+
+def predict_frames(frames, color_order='BGR', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Function to classify several in-memory video frames without touching the disk.
+
+    Args:
+        frames (list): uint8 frames of shape (H, W, 3).
+        color_order (str): Channel order of the frames, 'BGR' (OpenCV) or 'RGB'.
+        batch_size (int): Maximum number of frames sent to the model per call.
+
+    Returns:
+        tuple: Array of predicted class labels and array of confidence scores, one entry per frame.
+    """
+    frames = list(frames)
+    instrumentation.count('frames', len(frames))
+    try:
+        with instrumentation.profiled():
+            return classify_rgb(frames_to_rgb(frames, color_order), batch_size)
+    except Exception as e:
+        raise RuntimeError(f"Error during prediction: {e}")
+
+
+def predict_frame(frame, color_order='BGR', cache=None):
+    """
+    Function to classify a single in-memory video frame.
+
+    Args:
+        frame (np.ndarray): uint8 frame of shape (H, W, 3).
+        color_order (str): Channel order of the frame, 'BGR' (OpenCV) or 'RGB'.
+        cache (PredictionCache, optional): Reuse the result for frames with an identical model-sized RGB tensor.
 
     Returns:
         tuple: Predicted class label and confidence score.
     """
+    instrumentation.count('frames')
     try:
-        # Load and preprocess the image
-        img = load_img(file_path, target_size=(64, 64))  # Adjust size as needed
-        img_array = img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
-        img_array = preprocess_input(img_array)  # Preprocess input
-
-        # Make a prediction
-        predictions = model.predict(img_array)
-        predicted_class = np.argmax(predictions, axis=1)[0]
-        predicted_confidence = predictions[0][predicted_class]
-
-        # Map the predicted class index to the corresponding label
-        return class_labels[predicted_class], predicted_confidence
+        batch = frames_to_rgb([frame], color_order)
     except Exception as e:
         raise RuntimeError(f"Error during prediction: {e}")
+
+    def compute():
+        try:
+            with instrumentation.profiled():
+                labels, confidences = classify_rgb(batch, 1)
+        except Exception as e:
+            raise RuntimeError(f"Error during prediction: {e}")
+        return str(labels[0]), float(confidences[0])
+
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(cache.key_for_array(batch), compute)
@@ -0,0 +1,191 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+from tensorflow.keras.applications.vgg16 import preprocess_input
+
+from textile_core import IMG_SIZE, class_labels, predict_probabilities
+
+# Probability of a defect class (1 - P(Good)) above which a tile is flagged
+DEFAULT_DEFECT_THRESHOLD = 0.5
+
+# Tiles classified per model call; also bounds the working memory of a scan
+DEFAULT_TILE_BATCH_SIZE = 64
+
+# Longest side of the heatmap overlay, so very large scans render at a viewable size
+OVERLAY_MAX_SIDE = 1024
+
+GOOD_INDEX = class_labels.index('Good')
+
+# Largest scan decoded into memory from an encoded image (JPEG, PNG, TIFF); only `.npy` scans
+# are memory-mapped, so bigger scans must be converted to `.npy` first
+MAX_DECODED_SCAN_MB = 1024
+
+
+def check_scan_size(image):
+    """
+    Refuse encoded scans whose decoded pixels would not fit the memory limit.
+
+    Args:
+        image (PIL.Image.Image | bytes | memoryview): A lazily opened image, or its encoded bytes;
+            only the header is read.
+
+    Raises:
+        ValueError: With the size and how to process the scan instead.
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.open(io.BytesIO(image))
+    decoded_mb = image.width * image.height * 3 / 1024 ** 2
+    if decoded_mb > MAX_DECODED_SCAN_MB:
+        raise ValueError(
+            f"A {image.width}x{image.height} scan needs {decoded_mb:.0f} MB decoded, above the "
+            f"{MAX_DECODED_SCAN_MB} MB limit for JPEG, PNG and TIFF scans; save it as .npy "
+            f"(numpy.save) to have it memory-mapped instead"
+        )
+
+
+def load_scan(source):
+    """
+    Open a scan as an RGB uint8 array without copying more than necessary.
+
+    Args:
+        source (str | PIL.Image.Image | np.ndarray): Image path, PIL image or RGB array.
+            `.npy` files are memory-mapped, so scans larger than RAM are paged in tile by tile;
+            other image files are decoded whole and limited to MAX_DECODED_SCAN_MB.
+
+    Returns:
+        np.ndarray: Array of shape (H, W, 3).
+
+    Raises:
+        ValueError: If an encoded image file is too large to decode in memory.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, str) and source.endswith('.npy'):
+        return np.load(source, mmap_mode='r')
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    if not isinstance(source, Image.Image):
+        check_scan_size(image)
+    return np.asarray(image.convert('RGB') if image.mode != 'RGB' else image)
+
+
+def _positions(length, tile, stride):
+    """Tile origins along one axis; the last tile is aligned with the edge so borders are covered."""
+    positions = list(range(0, length - tile + 1, stride))
+    if positions[-1] != length - tile:
+        positions.append(length - tile)
+    return np.asarray(positions)
+
+
+def classify_tiles(source, tile_size=IMG_SIZE, stride=None, batch_size=DEFAULT_TILE_BATCH_SIZE,
+                   defect_threshold=DEFAULT_DEFECT_THRESHOLD):
+    """
+    Classify a large image as a grid of overlapping patches.
+
+    Patches are strided views into the image; only the patches of the batch currently being
+    classified are copied, so the working memory is bounded by `batch_size` regardless of
+    the scan size.
+
+    Args:
+        source (str | PIL.Image.Image | np.ndarray): The scan, see load_scan.
+        tile_size (tuple): Patch size as (height, width); patches are resized to the model input if different.
+        stride (tuple, optional): Step between patches as (dy, dx); defaults to half a tile (50% overlap).
+        batch_size (int): Patches per inference call.
+        defect_threshold (float): Defect probability above which a tile is flagged.
+
+    Returns:
+        dict: `ys`/`xs` tile origins, `probabilities` (rows, cols, classes), `labels` (rows, cols),
+            `defect_map` (rows, cols) of 1 - P(Good), `flagged` tile mask, the image-level
+            `verdict` and its `confidence`, and the scan `shape`.
+    """
+    image = load_scan(source)
+    tile_h, tile_w = tile_size
+    height, width = image.shape[:2]
+    if height < tile_h or width < tile_w:
+        raise ValueError(f"Image of size {width}x{height} is smaller than one {tile_w}x{tile_h} tile")
+    stride_y, stride_x = stride or (max(tile_h // 2, 1), max(tile_w // 2, 1))
+
+    ys, xs = _positions(height, tile_h, stride_y), _positions(width, tile_w, stride_x)
+    # (H - th + 1, W - tw + 1, th, tw, 3) view; no pixel data is copied here
+    windows = np.lib.stride_tricks.sliding_window_view(image, (tile_h, tile_w, 3))[:, :, 0]
+    origins = np.stack(np.meshgrid(ys, xs, indexing='ij'), axis=-1).reshape(-1, 2)
+
+    buffer = np.empty((batch_size, *IMG_SIZE, 3), dtype=np.float32)
+    probabilities = np.empty((len(origins), len(class_labels)), dtype=np.float32)
+    for start in range(0, len(origins), batch_size):
+        chunk = origins[start:start + batch_size]
+        batch = buffer[:len(chunk)]
+        for i, (y, x) in enumerate(chunk):
+            tile = windows[y, x]
+            if tile.shape[:2] != IMG_SIZE:
+                tile = cv2.resize(np.ascontiguousarray(tile), IMG_SIZE[::-1], interpolation=cv2.INTER_NEAREST_EXACT)
+            batch[i] = tile
+        probabilities[start:start + len(chunk)] = predict_probabilities(preprocess_input(batch), batch_size)
+
+    probabilities = probabilities.reshape(len(ys), len(xs), -1)
+    defect_map = 1.0 - probabilities[..., GOOD_INDEX]
+    flagged = defect_map >= defect_threshold
+    labels = np.asarray(class_labels, dtype=object)[np.argmax(probabilities, axis=-1)]
+
+    # The image is as bad as its worst tile
+    if flagged.any():
+        row, col = np.unravel_index(np.argmax(defect_map), defect_map.shape)
+        defects = probabilities[row, col].copy()
+        defects[GOOD_INDEX] = 0.0
+        verdict, confidence = class_labels[int(np.argmax(defects))], float(defect_map[row, col])
+    else:
+        verdict, confidence = 'Good', float(1.0 - defect_map.max())
+
+    return {
+        'ys': ys,
+        'xs': xs,
+        'tile_size': (tile_h, tile_w),
+        'shape': (height, width),
+        'probabilities': probabilities,
+        'labels': labels,
+        'defect_map': defect_map,
+        'flagged': flagged,
+        'verdict': verdict,
+        'confidence': confidence,
+    }
+
+
+def overlay_heatmap(source, result, alpha=0.45, max_side=OVERLAY_MAX_SIDE):
+    """
+    Render the defect map of classify_tiles over a downscaled copy of the scan.
+
+    Overlapping tiles contribute their maximum defect probability to each pixel.
+
+    Args:
+        source (str | PIL.Image.Image | np.ndarray): The scan that was classified.
+        result (dict): Output of classify_tiles.
+        alpha (float): Heatmap opacity.
+        max_side (int): Longest side of the rendered overlay.
+
+    Returns:
+        np.ndarray: RGB uint8 overlay image.
+    """
+    height, width = result['shape']
+    scale = min(1.0, max_side / max(height, width))
+    size = (max(int(width * scale), 1), max(int(height * scale), 1))
+    image = load_scan(source)
+    if scale < 1.0:
+        # Sample rows and columns of the (possibly memory-mapped) scan instead of loading it whole
+        rows = np.linspace(0, height - 1, size[1]).astype(int)
+        cols = np.linspace(0, width - 1, size[0]).astype(int)
+        image = image[np.ix_(rows, cols)]
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+
+    heat = np.zeros((size[1], size[0]), dtype=np.float32)
+    tile_h, tile_w = result['tile_size']
+    for r, y in enumerate(result['ys']):
+        for c, x in enumerate(result['xs']):
+            y0, x0 = int(y * scale), int(x * scale)
+            y1, x1 = max(int((y + tile_h) * scale), y0 + 1), max(int((x + tile_w) * scale), x0 + 1)
+            region = heat[y0:y1, x0:x1]
+            np.maximum(region, result['defect_map'][r, c], out=region)
+
+    colored = cv2.applyColorMap((heat * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    colored = cv2.cvtColor(colored, cv2.COLOR_BGR2RGB)
+    return cv2.addWeighted(image, 1.0 - alpha, colored, alpha, 0)
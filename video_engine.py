@@ -0,0 +1,231 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from instrumentation import count, stage
+from textile_core import DEFAULT_BATCH_SIZE, predict_frames
+
+# Marks the end of the stream in the stage queues
+_END = object()
+
+
+def overlay_label(frame, label, confidence):
+    """Draw the predicted label and confidence onto a BGR frame in place."""
+    cv2.putText(
+        frame, f"{label} ({confidence:.2f}%)", (10, 50),
+        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA
+    )
+    return frame
+
+
+def seek_to_frame(cap, input_path, frame_index):
+    """
+    Position a capture so the next read returns frame `frame_index`.
+
+    OpenCV reports back whatever position was requested, even when the container seek landed
+    elsewhere, so the seek goes to the frame before, decodes it and checks its timestamp against
+    the frame rate. If it does not match (inexact seeking, variable frame rate, a stream not
+    starting at zero), the capture is reopened and the frames are skipped one by one instead.
+    """
+    if frame_index <= 0:
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps and fps > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index - 1)
+        if cap.grab():
+            expected_ms = 1000.0 * (frame_index - 1) / fps
+            if abs(cap.get(cv2.CAP_PROP_POS_MSEC) - expected_ms) < 500.0 / fps:
+                return
+    cap.open(input_path)
+    for _ in range(frame_index):
+        if not cap.grab():
+            break
+
+
+def _put(q, item, stop):
+    """Put an item on a bounded queue, giving up if the pipeline has been stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Take an item from a queue, returning the end marker if the pipeline has been stopped."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+class VideoEngine:
+    """
+    Three-stage video pipeline: a reader thread decodes frames into batches, an inference
+    thread classifies each batch in one model call, and the calling thread overlays the
+    labels and encodes the output. Stages are connected by bounded queues so decoding
+    and encoding overlap with inference while memory stays bounded.
+
+    With a ChangeDetector, the reader marks frames that barely differ from the last
+    classified one and the inference stage reuses the previous label for them.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, queue_size=4, classify=predict_frames, detector=None):
+        """
+        Args:
+            batch_size (int): Number of frames sent to the model per inference call.
+            queue_size (int): Maximum number of batches waiting between two stages.
+            classify (callable): Function mapping a list of BGR frames to (labels, confidences).
+            detector (ChangeDetector, optional): Enables adaptive frame skipping.
+        """
+        if batch_size < 1 or queue_size < 1:
+            raise ValueError("batch_size and queue_size must be positive")
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.classify = classify
+        self.detector = detector
+
+    def _read(self, cap, decoded, stop, errors, limit=None):
+        """Reader stage: decode up to `limit` frames, flag the ones to classify and group them into batches."""
+        try:
+            batch, mask = [], []
+            remaining = limit
+            while not stop.is_set() and remaining != 0:
+                if remaining is not None:
+                    remaining -= 1
+                with stage('capture'):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                batch.append(frame)
+                infer = self.detector is None or self.detector.should_infer(frame)
+                if not infer:
+                    count('frames_skipped')
+                mask.append(infer)
+                if len(batch) == self.batch_size:
+                    if not _put(decoded, (batch, mask), stop):
+                        return
+                    batch, mask = [], []
+            if batch:
+                _put(decoded, (batch, mask), stop)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            _put(decoded, _END, stop)
+
+    def _infer(self, decoded, classified, stop, errors):
+        """Inference stage: classify the flagged frames of each batch with a single model call."""
+        try:
+            last = None
+            while not stop.is_set():
+                item = _get(decoded, stop)
+                if item is _END:
+                    break
+                batch, mask = item
+                selected = [frame for frame, infer in zip(batch, mask) if infer]
+                results = iter(zip(*self.classify(selected))) if selected else iter(())
+
+                # Frames that were not classified reuse the most recent result
+                labels, confidences = [], []
+                for infer in mask:
+                    if infer:
+                        last = next(results)
+                    labels.append(last[0])
+                    confidences.append(last[1])
+                if not _put(classified, (batch, labels, confidences), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            _put(classified, _END, stop)
+
+    def process(self, input_path, output_path, on_frame=None, frame_range=None):
+        """
+        Classify every frame of a video and write an annotated copy.
+
+        Args:
+            input_path (str): Path to the source video.
+            output_path (str): Path of the annotated MP4 to write.
+            on_frame (callable, optional): Called as on_frame(index, frame, label, confidence)
+                from the calling thread after each frame is annotated, e.g. for a preview.
+                `index` counts from the start of the processed range.
+            frame_range (tuple, optional): (start, end) frame indices to process instead of the whole
+                video; an end of None reads to the end of the file.
+
+        Returns:
+            dict: Number of frames processed and classified, skip ratio, elapsed seconds
+                and throughput in frames per second.
+        """
+        if self.detector is not None:
+            self.detector.reset()
+        cap = cv2.VideoCapture(input_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open video: {input_path}")
+        limit = None
+        if frame_range is not None:
+            start_frame, end_frame = frame_range
+            seek_to_frame(cap, input_path, start_frame)
+            limit = None if end_frame is None else max(0, end_frame - start_frame)
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        frame_width, frame_height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+
+        decoded = queue.Queue(maxsize=self.queue_size)
+        classified = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        stages = [
+            threading.Thread(target=self._read, args=(cap, decoded, stop, errors, limit), daemon=True),
+            threading.Thread(target=self._infer, args=(decoded, classified, stop, errors), daemon=True),
+        ]
+
+        start = time.perf_counter()
+        frame_count = 0
+        try:
+            for thread in stages:
+                thread.start()
+
+            # Writer stage runs on the calling thread so callbacks may use Streamlit
+            while True:
+                item = classified.get()
+                if item is _END:
+                    break
+                for frame, label, confidence in zip(*item):
+                    with stage('overlay'):
+                        overlay_label(frame, label, confidence)
+                    with stage('encode'):
+                        out.write(frame)
+                    if on_frame is not None:
+                        on_frame(frame_count, frame, label, confidence)
+                    frame_count += 1
+        finally:
+            stop.set()
+            for thread in stages:
+                thread.join()
+            cap.release()
+            out.release()
+
+        if errors:
+            raise errors[0]
+        elapsed = time.perf_counter() - start
+        inferred = self.detector.inferred if self.detector is not None else frame_count
+        return {
+            "frames": frame_count,
+            "inferred": inferred,
+            "skip_ratio": 1.0 - inferred / frame_count if frame_count else 0.0,
+            "seconds": elapsed,
+            "fps": frame_count / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+def process_video(input_path, output_path, batch_size=DEFAULT_BATCH_SIZE, queue_size=4, on_frame=None,
+                  detector=None):
+    """Convenience wrapper running a VideoEngine with the given settings over one video."""
+    return VideoEngine(batch_size, queue_size, detector=detector).process(input_path, output_path, on_frame)
@@ -0,0 +1,308 @@
+"""
+Memory-bounded handling of large video uploads and results.
+
+Uploads are copied to disk in fixed-size chunks, the VideoEngine streams the video frame by
+frame through bounded queues, a per-frame label timeline is written alongside the output as it
+is produced, and finished files are served over HTTP straight from disk, so a multi-gigabyte
+recording never has to fit in memory.
+
+Peak-memory check on a large synthetic video (stand-in model):
+    python video_stream.py memtest [--frames 3000] [--width 1920] [--height 1080] [--max-mb 512]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import secrets
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when saving an upload
+CHUNK_SIZE = 8 * 1024 ** 2
+
+# Decoded frames the video pipeline may hold at once, in MB
+DEFAULT_FRAME_BUDGET_MB = 256
+
+
+def save_upload(uploaded_file, path, chunk_size=CHUNK_SIZE):
+    """
+    Copy an upload (any file-like object) to `path` in fixed-size chunks.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    uploaded_file.seek(0)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(uploaded_file, f, chunk_size)
+        return f.tell()
+
+
+class LabelTimeline:
+    """
+    Writes the label of every frame to CSV as frames are produced, and a compact JSON summary of
+    the runs of identical labels when closed. Only the current run is held in memory.
+    """
+
+    def __init__(self, csv_path, json_path, fps):
+        """
+        Args:
+            csv_path (str): Per-frame timeline: frame, time in seconds, label, confidence.
+            json_path (str): Run-length summary: one segment per run of frames with the same label.
+            fps (float): Frame rate of the video, for the timestamps.
+        """
+        self.csv_path = csv_path
+        self.json_path = json_path
+        self.fps = fps or 1.0
+        self._file = open(csv_path, 'w', newline='')
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(('frame', 'time_s', 'label', 'confidence'))
+        self._segments_file = open(json_path, 'w')
+        self._segments_file.write('{"fps": %s, "segments": [' % json.dumps(self.fps))
+        self._segments = 0
+        self._run = None
+        self.frames = 0
+
+    def add(self, index, label, confidence):
+        """Record one frame; frames must arrive in order."""
+        self._csv.writerow((index, f"{index / self.fps:.3f}", label, f"{confidence:.4f}"))
+        if self._run is not None and self._run['label'] == label:
+            self._run['end_frame'] = index
+            self._run['max_confidence'] = max(self._run['max_confidence'], round(float(confidence), 4))
+        else:
+            self._flush_run()
+            self._run = {'label': str(label), 'start_frame': index, 'end_frame': index,
+                         'max_confidence': round(float(confidence), 4)}
+        self.frames += 1
+
+    def _flush_run(self):
+        if self._run is None:
+            return
+        self._run['start_s'] = round(self._run['start_frame'] / self.fps, 3)
+        self._run['end_s'] = round((self._run['end_frame'] + 1) / self.fps, 3)
+        self._segments_file.write((',' if self._segments else '') + '\n  ' + json.dumps(self._run))
+        self._segments += 1
+        self._run = None
+
+    def close(self):
+        self._flush_run()
+        self._segments_file.write('\n], "frames": %d}\n' % self.frames)
+        self._segments_file.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def bounded_engine(frame_bytes, budget_mb=DEFAULT_FRAME_BUDGET_MB, detector=None, batch_size=None):
+    """
+    Build a VideoEngine whose queued batches fit in `budget_mb` of decoded frames.
+
+    A running engine holds up to two queues of batches plus one batch in each of its three
+    stages, so the queue depth (and for very large frames the batch size) is derived from that.
+
+    Args:
+        frame_bytes (int): Size of one decoded frame.
+        budget_mb (float): Memory allowed for decoded frames.
+        detector (ChangeDetector, optional): Enables adaptive frame skipping.
+        batch_size (int, optional): Largest batch size; defaults to textile_core's.
+
+    Returns:
+        VideoEngine: The configured engine.
+    """
+    from textile_core import DEFAULT_BATCH_SIZE
+    from video_engine import VideoEngine
+
+    frames = max(1, int(budget_mb * 1024 ** 2 // frame_bytes))
+    # Smallest pipeline is one queued batch per queue plus three in flight
+    batch_size = max(1, min(batch_size or DEFAULT_BATCH_SIZE, frames // 5))
+    queue_size = max(1, (frames // batch_size - 3) // 2)
+    return VideoEngine(batch_size, queue_size, detector=detector)
+
+
+def process_video_streaming(input_path, output_dir, engine=None, on_frame=None, budget_mb=DEFAULT_FRAME_BUDGET_MB,
+                            detector=None, batch_size=None):
+    """
+    Classify a video on disk into `output_dir`: annotated MP4 plus CSV and JSON label timelines.
+
+    Args:
+        input_path (str): Source video.
+        output_dir (str): Directory for processed_video.mp4, labels.csv and labels.json.
+        engine (VideoEngine, optional): Engine to run; by default one bounded to `budget_mb`.
+        on_frame (callable, optional): Also called as on_frame(index, frame, label, confidence).
+        budget_mb (float): Memory allowed for decoded frames when no engine is given.
+        detector (ChangeDetector, optional): Enables adaptive frame skipping when no engine is given.
+        batch_size (int, optional): Largest batch size when no engine is given.
+
+    Returns:
+        dict: The engine's statistics plus the paths of the written files.
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {input_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_bytes = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3
+    cap.release()
+    engine = engine or bounded_engine(max(frame_bytes, 1), budget_mb, detector, batch_size)
+
+    paths = {
+        'video_path': os.path.join(output_dir, 'processed_video.mp4'),
+        'csv_path': os.path.join(output_dir, 'labels.csv'),
+        'json_path': os.path.join(output_dir, 'labels.json'),
+    }
+    with LabelTimeline(paths['csv_path'], paths['json_path'], fps) as timeline:
+        def record(index, frame, label, confidence):
+            timeline.add(index, label, confidence)
+            if on_frame is not None:
+                on_frame(index, frame, label, confidence)
+
+        stats = engine.process(input_path, paths['video_path'], on_frame=record)
+    stats.update(paths)
+    return stats
+
+
+class _DownloadHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.server.files.get(self.path.rsplit('/', 1)[-1])
+        if path is None or not os.path.exists(path):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        content_type = {'.mp4': 'video/mp4', '.csv': 'text/csv', '.json': 'application/json'}
+        self.send_header('Content-Type', content_type.get(os.path.splitext(path)[1], 'application/octet-stream'))
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadServer:
+    """
+    Serves registered files from disk in chunks, from a daemon thread.
+
+    Each file gets an unguessable token, so only links handed out by the app work.
+    """
+
+    def __init__(self, port, host='127.0.0.1', base_url=None):
+        """
+        Args:
+            port (int): Port to listen on.
+            host (str): Interface to bind; only this host by default, e.g. behind a reverse proxy.
+            base_url (str, optional): URL prefix browsers reach the server under, e.g. behind a proxy;
+                defaults to http://localhost:PORT.
+        """
+        self._server = ThreadingHTTPServer((host, port), _DownloadHandler)
+        self._server.files = {}
+        self.base_url = (base_url or f"http://localhost:{port}").rstrip('/')
+        threading.Thread(target=self._server.serve_forever, name='downloads-http', daemon=True).start()
+
+    def register(self, path):
+        """Make a file downloadable and return its URL."""
+        token = secrets.token_urlsafe(16)
+        self._server.files[token] = os.path.abspath(path)
+        return f"{self.base_url}/download/{token}"
+
+    def unregister_dir(self, directory):
+        """Stop serving every file under `directory`, e.g. before deleting it."""
+        directory = os.path.abspath(directory)
+        for token, path in list(self._server.files.items()):
+            if path.startswith(directory + os.sep):
+                del self._server.files[token]
+
+
+_download_server = None
+_download_lock = threading.Lock()
+
+
+def get_download_server():
+    """
+    Return the process-wide download server, or None when it is not configured or could not start.
+
+    Links are only useful if browsers can reach them, so the server needs both `download_port`
+    and `download_base_url`.
+    """
+    global _download_server
+    from settings import load_settings
+
+    settings = load_settings()
+    if not settings['download_port'] or not settings['download_base_url']:
+        return None
+    with _download_lock:
+        if _download_server is None:
+            try:
+                _download_server = DownloadServer(int(settings['download_port']), settings['download_host'],
+                                                  settings['download_base_url'])
+            except OSError as e:
+                logger.warning("Download server not started: %s", e)
+                return None
+    return _download_server
+
+
+def memory_test(frames, width, height, work_dir):
+    """
+    Process a large synthetic video through the streaming path with the stand-in model.
+
+    Returns:
+        dict: Video sizes, peak RSS before processing and its growth during processing, in MB.
+    """
+    from benchmark import _peak_rss_mb, _synthetic_video
+    from stand_in_model import use_stand_in_model
+
+    use_stand_in_model()
+    input_path = os.path.join(work_dir, 'large.mp4')
+    _synthetic_video(input_path, frames, size=(width, height))
+    # Upload copy from a file object, as Streamlit hands it over
+    copy_path = os.path.join(work_dir, 'upload.mp4')
+    with open(input_path, 'rb') as upload:
+        save_upload(upload, copy_path)
+
+    from textile_core import warm_up
+    warm_up(background=False)
+    baseline = _peak_rss_mb()
+    stats = process_video_streaming(copy_path, work_dir)
+    return {
+        'frames': stats['frames'],
+        'input_mb': os.path.getsize(input_path) / 1024 ** 2,
+        'output_mb': os.path.getsize(stats['video_path']) / 1024 ** 2,
+        'raw_frames_mb': frames * width * height * 3 / 1024 ** 2,
+        'baseline_rss_mb': baseline,
+        'peak_growth_mb': _peak_rss_mb() - baseline,
+    }
+
+
+def main():
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    test = commands.add_parser('memtest', help='Peak-memory check on a large synthetic video')
+    test.add_argument('--frames', type=int, default=3000)
+    test.add_argument('--width', type=int, default=1920)
+    test.add_argument('--height', type=int, default=1080)
+    test.add_argument('--max-mb', type=float, default=512, help='Allowed peak RSS growth while processing')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = memory_test(args.frames, args.width, args.height, work_dir)
+    print(f"Frames:               {report['frames']} ({report['raw_frames_mb']:.0f} MB decoded)")
+    print(f"Input / output video: {report['input_mb']:.0f} MB / {report['output_mb']:.0f} MB")
+    print(f"Peak RSS growth:      {report['peak_growth_mb']:.0f} MB (limit {args.max_mb:.0f} MB)")
+    if report['peak_growth_mb'] > args.max_mb:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
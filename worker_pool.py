@@ -0,0 +1,334 @@
+"""
+Multi-process inference for CPU-only hosts.
+
+TensorFlow does not scale a 64x64 EfficientNet-B0 across many cores at small batch sizes, so
+on large hosts several model replicas with few threads each beat one replica with all of them.
+WorkerPool starts one process per replica; each loads the model once with its own intra- and
+inter-op thread counts. Batches are written into per-worker shared-memory buffers and only the
+number of rows travels through the pipe, so no array is ever pickled.
+
+Enable it for textile_core with `"workers": N` in textile_config.json (or TEXTILE_WORKERS=N).
+
+Scaling benchmark:
+    python worker_pool.py [--max-workers N] [--batch-size 32] [--seconds 5] [--model PATH]
+"""
+import atexit
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backends import Backend, configure_threads, load_backend
+
+logger = logging.getLogger(__name__)
+
+# Model input as (height, width, channels) and number of classes; kept here so this module never imports textile_core
+INPUT_SHAPE = (64, 64, 3)
+NUM_CLASSES = 5
+
+# Largest number of rows a worker's shared buffers hold; bigger shards are split
+WORKER_CAPACITY = 64
+
+# Below this many rows per worker the pipe round trip costs more than the extra parallelism gains
+MIN_SHARD = 4
+
+
+def _worker_main(conn, input_name, output_name, capacity, input_shape, num_classes, backend, model_path,
+                 intra_op_threads, inter_op_threads, stand_in):
+    """Worker process: load the model once, then answer row counts sent over `conn`."""
+    configure_threads(intra_op_threads, inter_op_threads)
+    input_buffer = shared_memory.SharedMemory(name=input_name)
+    output_buffer = shared_memory.SharedMemory(name=output_name)
+    try:
+        inputs = np.ndarray((capacity, *input_shape), dtype=np.float32, buffer=input_buffer.buf)
+        outputs = np.ndarray((capacity, num_classes), dtype=np.float32, buffer=output_buffer.buf)
+        try:
+            if stand_in:
+                from backends import KerasBackend
+                from stand_in_model import build_stand_in_model
+
+                model = KerasBackend(build_stand_in_model())
+            else:
+                model = load_backend(backend, model_path, intra_op_threads)
+            model.warm_up()
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+            return
+        conn.send(('ready', os.getpid()))
+
+        while True:
+            rows = conn.recv()
+            if rows is None:
+                break
+            try:
+                outputs[:rows] = model.predict(inputs[:rows])
+                conn.send(('ok', rows))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+        del inputs, outputs
+    finally:
+        input_buffer.close()
+        output_buffer.close()
+
+
+class _Worker:
+    """Parent-side handle of one worker process and its shared buffers."""
+
+    def __init__(self, context, capacity, input_shape, num_classes, worker_args):
+        self.capacity = capacity
+        # Set once the pipe to the process broke, i.e. the process is gone or going
+        self.dead = False
+        self.input_buffer = shared_memory.SharedMemory(create=True, size=capacity * math.prod(input_shape) * 4)
+        self.output_buffer = shared_memory.SharedMemory(create=True, size=capacity * num_classes * 4)
+        self.inputs = np.ndarray((capacity, *input_shape), dtype=np.float32, buffer=self.input_buffer.buf)
+        self.outputs = np.ndarray((capacity, num_classes), dtype=np.float32, buffer=self.output_buffer.buf)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.input_buffer.name, self.output_buffer.name, capacity, input_shape,
+                  num_classes, *worker_args),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self):
+        status, detail = self._receive()
+        if status != 'ready':
+            raise RuntimeError(f"Inference worker failed to start: {detail}")
+
+    def _receive(self):
+        try:
+            return self.conn.recv()
+        except EOFError:
+            self.dead = True
+            raise RuntimeError(f"Inference worker {self.process.pid} exited unexpectedly")
+
+    def run(self, batch):
+        """Copy a batch into shared memory, have the worker classify it and return a copy of the outputs."""
+        rows = len(batch)
+        self.inputs[:rows] = batch
+        try:
+            self.conn.send(rows)
+        except (BrokenPipeError, OSError):
+            self.dead = True
+            raise RuntimeError(f"Inference worker {self.process.pid} exited unexpectedly")
+        status, detail = self._receive()
+        if status != 'ok':
+            raise RuntimeError(f"Inference worker failed: {detail}")
+        return self.outputs[:rows].copy()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        # Drop the views before releasing the memory they point into
+        del self.inputs, self.outputs
+        for buffer in (self.input_buffer, self.output_buffer):
+            buffer.close()
+            buffer.unlink()
+
+
+class WorkerPool(Backend):
+    """
+    Backend spreading inference over several model replicas in separate processes.
+
+    A batch is cut into one shard per worker (at least MIN_SHARD rows each) and every shard goes
+    to whichever worker is idle first, so concurrent callers share the pool without waiting on
+    a fixed assignment.
+    """
+
+    name = 'pool'
+
+    def __init__(self, workers, model_path=None, backend='keras', intra_op_threads=None, inter_op_threads=1,
+                 capacity=WORKER_CAPACITY, input_shape=INPUT_SHAPE, num_classes=NUM_CLASSES, stand_in=False):
+        """
+        Args:
+            workers (int): Number of worker processes.
+            model_path (str, optional): Model artifact each worker loads; ignored with `stand_in`.
+            backend (str): Inference backend used inside the workers, 'keras', 'tflite' or 'onnx'.
+            intra_op_threads (int, optional): Threads per worker; defaults to an equal share of the CPUs.
+            inter_op_threads (int, optional): Inter-op threads per worker.
+            capacity (int): Rows held by each worker's shared buffers.
+            input_shape (tuple): Model input shape without the batch dimension.
+            num_classes (int): Number of model outputs.
+            stand_in (bool): Load the tiny stand-in model instead, for benchmarks and tests.
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+        if intra_op_threads is None:
+            intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+        self.workers = workers
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self._input_shape = tuple(input_shape)
+        self._num_classes = num_classes
+        self._capacity = capacity
+
+        # Spawned workers start from a clean interpreter and never inherit this process's TensorFlow state
+        self._context = multiprocessing.get_context('spawn')
+        self._worker_args = (backend, model_path, intra_op_threads, inter_op_threads, stand_in)
+        self._workers = []
+        self._workers_lock = threading.Lock()
+        try:
+            for _ in range(workers):
+                self._workers.append(self._start_worker())
+            for worker in self._workers:
+                worker.wait_ready()
+        except Exception:
+            self.close()
+            raise
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        self._dispatch = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pool-dispatch')
+        self._closed = False
+        self._close_lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def input_shape(self):
+        return (None, *self._input_shape)
+
+    def _start_worker(self):
+        return _Worker(self._context, self._capacity, self._input_shape, self._num_classes, self._worker_args)
+
+    def _replace(self, dead):
+        """
+        Swap a worker whose process died for a fresh one.
+
+        Returns:
+            _Worker: The new worker, or None if it failed to start (the pool then runs with one fewer).
+        """
+        dead.close()
+        with self._workers_lock:
+            self._workers.remove(dead)
+        worker = None
+        try:
+            worker = self._start_worker()
+            worker.wait_ready()
+        except Exception as e:
+            logger.warning("Could not replace inference worker %s: %s", dead.process.pid, e)
+            if worker is not None:
+                worker.close()
+            return None
+        logger.warning("Inference worker %s died and was replaced by %s", dead.process.pid, worker.process.pid)
+        with self._workers_lock:
+            self._workers.append(worker)
+        return worker
+
+    def _run_shard(self, shard):
+        if not self._workers:
+            raise RuntimeError("No inference workers left")
+        worker = self._idle.get()
+        try:
+            return worker.run(shard)
+        except Exception:
+            if worker.dead or not worker.process.is_alive():
+                # Never hand a dead process the next shard
+                worker = self._replace(worker)
+            raise
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def _shards(self, rows):
+        size = max(MIN_SHARD, math.ceil(rows / self.workers))
+        size = min(size, self._capacity)
+        return [(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if len(batch) == 0:
+            return np.empty((0, self._num_classes), dtype=np.float32)
+        shards = self._shards(len(batch))
+        if len(shards) == 1:
+            return self._run_shard(batch)
+        futures = [self._dispatch.submit(self._run_shard, batch[start:end]) for start, end in shards]
+        return np.concatenate([future.result() for future in futures])
+
+    def close(self):
+        """Stop the workers and release the shared memory. Safe to call more than once."""
+        lock = getattr(self, '_close_lock', None)
+        if lock is not None:
+            with lock:
+                if self._closed:
+                    return
+                self._closed = True
+            self._dispatch.shutdown(wait=True)
+        for worker in list(self._workers):
+            worker.close()
+        self._workers = []
+
+
+def _throughput(pool, batch_size, seconds, callers):
+    """Images per second with `callers` threads each classifying batches of `batch_size` for `seconds`."""
+    import time
+
+    batch = np.random.default_rng(0).uniform(0, 255, (batch_size, *INPUT_SHAPE)).astype(np.float32)
+    pool.predict(batch)
+    done = [0] * callers
+    deadline = time.perf_counter() + seconds
+
+    def run(index):
+        while time.perf_counter() < deadline:
+            pool.predict(batch)
+            done[index] += batch_size
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / (time.perf_counter() - start)
+
+
+def _worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inference throughput of the worker pool for 1 to N workers.')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='Largest pool size tested')
+    parser.add_argument('--batch-size', type=int, default=32, help='Images per predict call')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Measurement time per pool size')
+    parser.add_argument('--inter-op-threads', type=int, default=1)
+    parser.add_argument('--model', help='Model artifact; the tiny stand-in model when omitted')
+    parser.add_argument('--backend', default='keras')
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'threads/worker':>16}{'images/s':>12}{'speed-up':>10}")
+    baseline = None
+    for workers in _worker_counts(args.max_workers):
+        pool = WorkerPool(workers, args.model, args.backend, inter_op_threads=args.inter_op_threads,
+                          stand_in=args.model is None)
+        try:
+            # Enough concurrent callers to keep every worker busy
+            rate = _throughput(pool, args.batch_size, args.seconds, callers=max(2, workers))
+        finally:
+            pool.close()
+        baseline = baseline or rate
+        print(f"{workers:>8}{pool.intra_op_threads:>16}{rate:>12.1f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()